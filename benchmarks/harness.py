@@ -0,0 +1,118 @@
+"""Shared helpers for the offline benchmarks.
+
+``load_server`` imports quiz-server.py with the ``fake`` LLM backend and with
+caching, the question bank and trace logging switched off unless the caller
+overrides them. ``asgi_request`` calls the app in-process, so a run has no
+network and no uvicorn. ``compare_to_baseline`` flags regressions against a
+previous run saved with ``--output``.
+"""
+import asyncio
+import importlib.util
+import json
+import math
+import os
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SERVER_DEFAULTS = {
+    "QUIZ_LLM_BACKEND": "fake",
+    "QUIZ_CACHE_BACKEND": "none",
+    "QUIZ_BANK_ENABLED": "0",
+    "QUIZ_JOBS_PATH": ":memory:",
+    "QUIZ_TRACE_SAMPLE_RATE": "0",
+    "QUIZ_RAW_OUTPUT_SAMPLE_RATE": "0",
+}
+
+
+def load_server(**env: str):
+    """Import quiz-server.py as a module. ``env`` overrides QUIZ_* settings."""
+    for name, value in SERVER_DEFAULTS.items():
+        os.environ.setdefault(name, value)
+    os.environ.update(env)
+    spec = importlib.util.spec_from_file_location("quiz_server", os.path.join(ROOT, "quiz-server.py"))
+    server = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(server)
+    if os.environ["QUIZ_TRACE_SAMPLE_RATE"] == "0":
+        # Error and repair events are not sampled; keep them out of the report.
+        import quiz_metrics
+        quiz_metrics.background_log.stream = open(os.devnull, "w")
+    return server
+
+
+async def asgi_request(app, method: str, path: str, body=None, headers: Iterable[Tuple[bytes, bytes]] = ()) -> Tuple[int, bytes]:
+    """Send one HTTP request straight to an ASGI app and return (status, body)."""
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode()), *headers],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    sent = False
+    status = 0
+    chunks = []
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": payload, "more_body": False}
+        # The client never disconnects; streaming responses wait on this until they finish.
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of ``values`` (q in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(len(ordered) * q / 100))
+    return ordered[rank - 1]
+
+
+def compare_to_baseline(results: Dict[str, float], baseline: Dict[str, float], tolerance: float, higher_is_better=()) -> List[str]:
+    """Describe every metric that got worse than ``baseline`` by more than ``tolerance``."""
+    regressions = []
+    for name, old in baseline.items():
+        new = results.get(name)
+        if not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or not old:
+            continue
+        change = (new - old) / old
+        if name in higher_is_better:
+            change = -change
+        if change > tolerance:
+            regressions.append(f"{name}: {old:.6g} -> {new:.6g} ({change:+.1%} worse)")
+    return regressions
+
+
+def write_results(path: Optional[str], results: dict) -> None:
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+def read_results(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
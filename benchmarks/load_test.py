@@ -0,0 +1,164 @@
+"""Load-test the quiz API against the fake LLM backend.
+
+Requests go to the app in-process, with the ``fake`` backend standing in for
+the provider. You set its latency distribution, token rate and error and
+malformed-output rates. The workload and every simulated LLM call are seeded,
+so two runs of the same code give the same sequence of events. That makes
+the reported throughput and latency percentiles comparable across commits.
+
+    python benchmarks/load_test.py --requests 400 --concurrency 32 --latency 0.3 --tokens-per-second 80
+    python benchmarks/load_test.py --output before.json
+    python benchmarks/load_test.py --baseline before.json   # exits 1 on a regression
+
+``--replay requests.jsonl`` replays a request log instead of a generated
+workload. Each line is a JSON object with ``topic`` and optional
+``difficulty``, ``num_questions``, ``endpoint`` (``generate`` or ``stream``)
+and ``offset`` (seconds after the start at which to send it). Entries with an
+offset are sent at that time whatever the concurrency; the rest run through
+the ``--concurrency`` workers.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter
+
+from harness import asgi_request, compare_to_baseline, load_server, percentile, read_results, write_results
+
+ENDPOINTS = {"generate": "/api/generate-quiz", "stream": "/api/generate-quiz/stream"}
+DIFFICULTIES = ["easy", "medium", "hard"]
+
+
+def generated_workload(args) -> list:
+    rng = random.Random(args.seed)
+    return [
+        {
+            "topic": f"Benchmark Topic {rng.randrange(args.topics)}",
+            "difficulty": rng.choice(DIFFICULTIES),
+            "num_questions": args.num_questions,
+            "endpoint": args.endpoint,
+        }
+        for _ in range(args.requests)
+    ]
+
+
+def replay_workload(path: str, default_endpoint: str) -> list:
+    workload = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(entry, dict) or not isinstance(entry.get("topic"), str):
+                continue
+            workload.append({
+                "topic": entry["topic"],
+                "difficulty": entry.get("difficulty", "medium"),
+                "num_questions": entry.get("num_questions", 5),
+                "endpoint": entry.get("endpoint", default_endpoint),
+                "offset": entry.get("offset"),
+            })
+    return workload
+
+
+async def send(app, entry: dict, latencies: list, statuses: Counter) -> None:
+    body = {key: entry[key] for key in ("topic", "difficulty", "num_questions")}
+    started = time.perf_counter()
+    status, _ = await asgi_request(app, "POST", ENDPOINTS[entry["endpoint"]], body)
+    latencies.append(time.perf_counter() - started)
+    statuses[status] += 1
+
+
+async def drive(app, workload: list, concurrency: int):
+    latencies, statuses = [], Counter()
+    timed = [entry for entry in workload if entry.get("offset") is not None]
+    queued = [entry for entry in workload if entry.get("offset") is None]
+    start = time.perf_counter()
+
+    async def worker():
+        while queued:
+            await send(app, queued.pop(0), latencies, statuses)
+
+    async def at_offset(entry):
+        await asyncio.sleep(max(0.0, start + float(entry["offset"]) - time.perf_counter()))
+        await send(app, entry, latencies, statuses)
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(queued)))), *(at_offset(e) for e in timed))
+    return time.perf_counter() - start, latencies, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100, help="requests in a generated workload")
+    parser.add_argument("--concurrency", type=int, default=16, help="requests in flight at once")
+    parser.add_argument("--topics", type=int, default=50, help="distinct topics in a generated workload")
+    parser.add_argument("--num-questions", type=int, default=5)
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="generate")
+    parser.add_argument("--replay", help="JSON lines request log to replay instead of a generated workload")
+    parser.add_argument("--latency", type=float, default=0.2, help="median fake time to first token, seconds")
+    parser.add_argument("--latency-jitter", type=float, default=0.3, help="sigma of the log-normal latency")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0, help="fake output rate (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="keep the in-memory quiz cache on")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    args = parser.parse_args()
+
+    server = load_server(
+        QUIZ_FAKE_LATENCY=str(args.latency),
+        QUIZ_FAKE_LATENCY_JITTER=str(args.latency_jitter),
+        QUIZ_FAKE_TOKENS_PER_SECOND=str(args.tokens_per_second),
+        QUIZ_FAKE_ERROR_RATE=str(args.error_rate),
+        QUIZ_FAKE_MALFORMED_RATE=str(args.malformed_rate),
+        QUIZ_FAKE_SEED=str(args.seed),
+        **({"QUIZ_CACHE_BACKEND": "memory"} if args.cache else {}),
+    )
+    import quiz_metrics
+
+    workload = replay_workload(args.replay, args.endpoint) if args.replay else generated_workload(args)
+    if not workload:
+        sys.exit("No requests to send")
+    elapsed, latencies, statuses = asyncio.run(drive(server.app, workload, args.concurrency))
+
+    sources = Counter()
+    for (_, source), count in quiz_metrics.REQUESTS.samples().items():
+        sources[source] += int(count)
+    results = {
+        "requests": len(latencies),
+        "seconds": elapsed,
+        "throughput": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "sources": dict(sorted(sources.items())),
+        "llm_prompts": server.prompt_builder.prompts_built,
+    }
+    print(f"{results['requests']} requests in {elapsed:.2f}s: {results['throughput']:.1f} req/s")
+    print(f"latency p50 {results['p50'] * 1000:.1f} ms, p95 {results['p95'] * 1000:.1f} ms, "
+          f"p99 {results['p99'] * 1000:.1f} ms, max {results['max'] * 1000:.1f} ms")
+    print(f"statuses {results['statuses']}, sources {results['sources']}, LLM prompts {results['llm_prompts']}")
+    write_results(args.output, results)
+
+    if args.baseline:
+        regressions = compare_to_baseline(
+            results, read_results(args.baseline), args.tolerance, higher_is_better=("throughput",)
+        )
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
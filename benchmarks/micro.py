@@ -0,0 +1,85 @@
+"""Micro-benchmarks for the server's CPU-bound hot paths.
+
+Times JSON extraction, parsing and validation of LLM output, the fallback quiz
+and prompt building on fixed inputs. Each figure is the best of ``--rounds``
+runs. It is also reported relative to a fixed pure-Python reference workload
+timed alongside it. The relative figures are what ``--baseline`` compares,
+so a machine that is uniformly faster or slower, or a noisy neighbour, does
+not read as a regression.
+
+    python benchmarks/micro.py
+    python benchmarks/micro.py --output micro.json
+    python benchmarks/micro.py --baseline micro.json --tolerance 0.25
+"""
+import argparse
+import json
+import sys
+import timeit
+
+from harness import compare_to_baseline, load_server, read_results, write_results
+
+from llm_backends import FakeChatModel  # noqa: E402  (harness puts the repo root on sys.path)
+
+
+def llm_output(server, num_questions: int) -> str:
+    """What a chatty model returns: the quiz JSON wrapped in prose."""
+    prompt = server.prompt_builder.build("World Geography", "medium", num_questions)
+    quiz = json.loads(FakeChatModel().invoke(prompt.messages).content)
+    return f"Sure! Here is your quiz:\n{json.dumps(quiz, indent=4)}\nGood luck!"
+
+
+def reference_workload():
+    return sorted(str(i) for i in range(200))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=1000, help="calls per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args()
+
+    server = load_server()
+    small, large = llm_output(server, 5), llm_output(server, 20)
+    quiz = json.loads(server.extract_json(small))
+    question = quiz["questions"][0]
+
+    cases = {
+        "extract_json_5": lambda: server.extract_json(small),
+        "extract_json_20": lambda: server.extract_json(large),
+        "parse_quiz_output_5": lambda: server.parse_quiz_output(small, "World Geography", "medium"),
+        "parse_quiz_output_20": lambda: server.parse_quiz_output(large, "World Geography", "medium"),
+        "validate_question": lambda: server.validate_question(question, 1),
+        "quiz_response_validation": lambda: server.QuizResponse(**quiz),
+        "quiz_response_dump": lambda: server.QuizResponse(**quiz).model_dump(),
+        "generate_fallback_quiz": lambda: server.generate_fallback_quiz("Mathematics", "medium", 5),
+        "fallback_response": lambda: server.fallback_response("Mathematics", "medium", 5).response(),
+        "fallback_response_unknown_topic": lambda: server.fallback_response("Bees", "hard", 5).response(),
+        "prompt_build": lambda: server.prompt_builder.build("World Geography", "medium", 5),
+    }
+
+    reference_number = max(1, args.number // 10)
+    timings, relative = {}, {}
+    print(f"{'benchmark':<34}{'us/call':>10}{'relative':>10}")
+    for name, fn in cases.items():
+        best = reference = float("inf")
+        for _ in range(args.rounds):
+            reference = min(reference, timeit.timeit(reference_workload, number=reference_number) / reference_number)
+            best = min(best, timeit.timeit(fn, number=args.number) / args.number)
+        timings[name] = best * 1e6
+        relative[name] = best / reference
+        print(f"{name:<34}{best * 1e6:>10.2f}{best / reference:>10.3f}")
+    write_results(args.output, {"us_per_call": timings, "relative": relative})
+
+    if args.baseline:
+        regressions = compare_to_baseline(relative, read_results(args.baseline)["relative"], args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
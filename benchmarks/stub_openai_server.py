@@ -0,0 +1,106 @@
+"""A local OpenAI-compatible ``/chat/completions`` server for offline runs.
+
+Answers with the ``fake`` backend's placeholder quizzes, with the same
+latency, token-rate and error settings, so the ``router`` backend can be
+exercised against several endpoints without network access. It supports
+``"stream": true`` and keeps connections alive. ``GET /stats`` reports how
+many connections and requests it has seen.
+
+    python benchmarks/stub_openai_server.py --port 9001 --latency 0.2 &
+    python benchmarks/stub_openai_server.py --port 9002 --latency 0.8 &
+    QUIZ_LLM_BACKEND=router QUIZ_ROUTER_ENDPOINTS='[{"name": "fast", "base_url": "http://127.0.0.1:9001/v1", "model": "stub"},
+        {"name": "slow", "base_url": "http://127.0.0.1:9002/v1", "model": "stub"}]' python benchmarks/load_test.py
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from harness import ROOT  # noqa: F401  (puts the repo root on sys.path)
+from llm_backends import FakeChatModel, FakeLLMError
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    model: FakeChatModel = None
+    counters = {"connections": 0, "requests": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with self.lock:
+            self.counters["connections"] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.lock:
+                self._send_json(200, dict(self.counters))
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": "not found"})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        with self.lock:
+            self.counters["requests"] += 1
+        try:
+            content = self.model.invoke(request["messages"]).content
+        except FakeLLMError as e:
+            with self.lock:
+                self.counters["errors"] += 1
+            self._send_json(500, {"error": {"message": str(e)}})
+            return
+        if not request.get("stream"):
+            self._send_json(200, {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]})
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        events = [{"choices": [{"index": 0, "delta": {"content": content[i:i + 16]}}]} for i in range(0, len(content), 16)]
+        for data in [json.dumps(event) for event in events] + ["[DONE]"]:
+            chunk = f"data: {data}\n\n".encode()
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency", type=float, default=0.2, help="median seconds before answering")
+    parser.add_argument("--latency-jitter", type=float, default=0.3, help="sigma of the log-normal latency")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    StubHandler.model = FakeChatModel(
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), StubHandler)
+    server.daemon_threads = True
+    print(f"Stub OpenAI server on http://{args.host}:{args.port}/v1 ({time.strftime('%H:%M:%S')})")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
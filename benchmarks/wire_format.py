@@ -0,0 +1,66 @@
+"""Compare the JSON and compact LLM output formats.
+
+Encodes the built-in fallback quizzes each way and reports output tokens,
+the generation time those tokens imply at a given decode rate, and the
+server-side cost of decoding each format.
+
+    python benchmarks/wire_format.py --tokens-per-second 60
+"""
+import argparse
+import ast
+import json
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from quiz_prompts import count_tokens  # noqa: E402
+from quiz_wire import decode_compact, encode_compact  # noqa: E402
+
+
+def load_fallback_quizzes() -> dict:
+    """Read FALLBACK_QUIZZES from quiz-server.py without importing the server."""
+    with open(os.path.join(ROOT, "quiz-server.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == "FALLBACK_QUIZZES" for t in node.targets):
+            return ast.literal_eval(node.value)
+    raise RuntimeError("FALLBACK_QUIZZES not found in quiz-server.py")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="model decode rate used to estimate latency")
+    parser.add_argument("--repeat", type=int, default=2000, help="decode iterations per quiz")
+    args = parser.parse_args()
+
+    rows = []
+    for topic, questions in load_fallback_quizzes().items():
+        quiz = {"title": f"{topic} Quiz", "description": f"A medium difficulty quiz about {topic}", "questions": questions}
+        # The JSON prompt shows an indented schema and models usually mirror that
+        # layout; the minified size is the floor for the JSON format.
+        as_indented = json.dumps(quiz, ensure_ascii=False, indent=4)
+        as_minified = json.dumps(quiz, ensure_ascii=False)
+        as_compact = encode_compact(quiz)
+        json_decode = timeit.timeit(lambda: json.loads(as_indented), number=args.repeat) / args.repeat
+        compact_decode = timeit.timeit(lambda: decode_compact(json.loads(as_compact)), number=args.repeat) / args.repeat
+        rows.append((topic, count_tokens(as_indented), count_tokens(as_minified), count_tokens(as_compact), json_decode, compact_decode))
+
+    print(f"{'topic':<26}{'json':>8}{'minified':>10}{'compact':>9}{'json dec us':>13}{'compact dec us':>16}")
+    for topic, indented, minified, compact, json_decode, compact_decode in rows:
+        print(f"{topic:<26}{indented:>8}{minified:>10}{compact:>9}{json_decode * 1e6:>13.1f}{compact_decode * 1e6:>16.1f}")
+
+    totals = [sum(row[i] for row in rows) for i in (1, 2, 3)]
+    print()
+    for name, total in zip(("json", "minified json", "compact"), totals):
+        per_quiz = total / len(rows)
+        print(
+            f"{name:<14} {total:>6} output tokens ({1 - total / totals[0]:>5.1%} fewer than json), "
+            f"~{per_quiz / args.tokens_per_second:.2f}s per quiz at {args.tokens_per_second:g} tok/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Image providers and an on-disk, content-addressed image cache.
+
+Providers are registered by name like the LLM backends and built only when
+selected. ``placeholder`` draws an SVG card locally, for tests and offline
+runs; ``openai`` calls the images API. An image is stored under the SHA-256
+of its provider, model and prompt, so a prompt that was drawn once is served
+from disk from then on and never reaches the provider again. Files never
+change once written, which lets clients cache them forever.
+"""
+import asyncio
+import base64
+import hashlib
+import html
+import os
+import re
+import tempfile
+import textwrap
+from typing import Callable, Dict, Iterable, List, Optional
+
+from quiz_metrics import log_event
+
+IMAGE_PROVIDERS: Dict[str, Callable[[], object]] = {}
+
+NAME_PATTERN = re.compile(r"^[0-9a-f]{64}\.(svg|png)$")
+MEDIA_TYPES = {"svg": "image/svg+xml", "png": "image/png"}
+
+
+def register_image_provider(name: str):
+    def decorator(factory):
+        IMAGE_PROVIDERS[name] = factory
+        return factory
+    return decorator
+
+
+class PlaceholderImageProvider:
+    """Draws the prompt on a coloured card; no network, same bytes for the same prompt."""
+
+    name = "placeholder"
+    model = "svg"
+    extension = "svg"
+    size = 512
+
+    async def generate(self, prompt: str) -> bytes:
+        hue = int(hashlib.sha256(prompt.encode()).hexdigest()[:4], 16) % 360
+        lines = textwrap.wrap(prompt, 34)[:12]
+        top = self.size / 2 - (len(lines) - 1) * 12
+        text = "".join(
+            f'<text x="50%" y="{top + i * 24:.0f}" text-anchor="middle">{html.escape(line)}</text>'
+            for i, line in enumerate(lines)
+        )
+        return (
+            f'<svg xmlns="http://www.w3.org/2000/svg" width="{self.size}" height="{self.size}" viewBox="0 0 {self.size} {self.size}">'
+            f'<rect width="100%" height="100%" fill="hsl({hue},55%,45%)"/>'
+            f'<g fill="#fff" font-family="sans-serif" font-size="18">{text}</g></svg>'
+        ).encode()
+
+
+class OpenAIImageProvider:
+    """The OpenAI images API, asked for base64 PNGs so the bytes can be cached."""
+
+    name = "openai"
+    extension = "png"
+
+    def __init__(self, api_key: Optional[str], model: str = "dall-e-3", size: str = "1024x1024", timeout: float = 120.0):
+        import httpx
+
+        self.model = model
+        self.size = size
+        self.client = httpx.AsyncClient(
+            base_url="https://api.openai.com/v1",
+            headers={"Authorization": f"Bearer {api_key}"} if api_key else {},
+            timeout=timeout,
+        )
+
+    async def generate(self, prompt: str) -> bytes:
+        response = await self.client.post(
+            "/images/generations",
+            json={"model": self.model, "prompt": prompt, "n": 1, "size": self.size, "response_format": "b64_json"},
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"OpenAI images API: HTTP {response.status_code}: {response.text[:200]}")
+        return base64.b64decode(response.json()["data"][0]["b64_json"])
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+@register_image_provider("placeholder")
+def initialize_placeholder_images():
+    return PlaceholderImageProvider()
+
+
+@register_image_provider("openai")
+def initialize_openai_images():
+    return OpenAIImageProvider(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        model=os.getenv("QUIZ_IMAGE_MODEL", "dall-e-3"),
+        size=os.getenv("QUIZ_IMAGE_SIZE", "1024x1024"),
+    )
+
+
+def create_image_provider(name: str):
+    if name not in IMAGE_PROVIDERS:
+        raise ValueError(f"Unknown image provider {name!r}; choose from {sorted(IMAGE_PROVIDERS)}")
+    return IMAGE_PROVIDERS[name]()
+
+
+class ImageCache:
+    """Content-addressed image files with at most ``concurrency`` provider calls at once.
+
+    ``prefetch`` starts generating every missing image of a batch in the
+    background and returns their file names straight away. ``path`` waits
+    for an image still being generated. Concurrent requests for the same
+    prompt share one provider call.
+    """
+
+    def __init__(self, directory: str, provider, concurrency: int = 4):
+        self.directory = directory
+        self.provider = provider
+        self.hits = 0
+        self.generated = 0
+        self.errors = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    def name_for(self, prompt: str) -> str:
+        key = f"{self.provider.name}\0{getattr(self.provider, 'model', '')}\0{prompt}"
+        return f"{hashlib.sha256(key.encode()).hexdigest()}.{self.provider.extension}"
+
+    def file_path(self, name: str) -> str:
+        return os.path.join(self.directory, name[:2], name)
+
+    def media_type(self, name: str) -> str:
+        return MEDIA_TYPES[name.rsplit(".", 1)[1]]
+
+    def prefetch(self, prompts: Iterable[str]) -> List[str]:
+        names = []
+        for prompt in prompts:
+            name = self.name_for(prompt)
+            names.append(name)
+            if name in self._pending:
+                continue
+            if os.path.exists(self.file_path(name)):
+                self.hits += 1
+                continue
+            task = asyncio.create_task(self._generate(name, prompt))
+            self._pending[name] = task
+            task.add_done_callback(lambda t, name=name: self._finish(name, t))
+        return names
+
+    async def ensure(self, prompt: str) -> str:
+        """Generate the image for ``prompt`` unless it is cached; returns its file path."""
+        name = self.prefetch([prompt])[0]
+        return await self.path(name)
+
+    async def path(self, name: str) -> Optional[str]:
+        """Path of a cached image, waiting for it if it is being generated; None if unknown."""
+        task = self._pending.get(name)
+        if task is not None:
+            # A failed generation is logged by _finish; the image is just missing.
+            await asyncio.wait([task])
+        path = self.file_path(name)
+        return path if os.path.exists(path) else None
+
+    async def _generate(self, name: str, prompt: str) -> None:
+        async with self._semaphore:
+            data = await self.provider.generate(prompt)
+        await asyncio.get_running_loop().run_in_executor(None, self._write, self.file_path(name), data)
+        self.generated += 1
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a reader never sees a partly written image.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _finish(self, name: str, task: asyncio.Task) -> None:
+        self._pending.pop(name, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+            log_event("image_error", image=name, error=str(task.exception()))
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.provider.name,
+            "hits": self.hits,
+            "generated": self.generated,
+            "errors": self.errors,
+            "pending": len(self._pending),
+        }
+
+    async def close(self) -> None:
+        for task in self._pending.values():
+            task.cancel()
+        if hasattr(self.provider, "aclose"):
+            await self.provider.aclose()
@@ -0,0 +1,296 @@
+"""LLM backends, selected by name and imported only when first used.
+
+The OpenAI and Hugging Face backends pull in heavy libraries (LangChain,
+transformers), so nothing is imported at module load. ``LazyBackend`` builds
+the selected backend in a worker thread on first use or during startup
+warm-up, which keeps server cold start fast and memory small.
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import time
+import zlib
+from typing import Callable, Dict, NamedTuple, Optional
+
+from quiz_metrics import log_event
+
+BACKENDS: Dict[str, Callable[[], object]] = {}
+
+
+def register_backend(name: str):
+    def decorator(factory):
+        BACKENDS[name] = factory
+        return factory
+    return decorator
+
+
+@register_backend("openai")
+def initialize_chatopenai_llm():
+    try:
+        from langchain_openai import ChatOpenAI
+    except ImportError:
+        from langchain.chat_models import ChatOpenAI
+    # Use ChatOpenAI with a specific model (e.g. gpt-3.5-turbo) and parameters
+    return ChatOpenAI(
+        model_name=os.getenv("QUIZ_OPENAI_MODEL", "gpt-4o-mini"),
+        temperature=0.2,
+        api_key=os.getenv("OPENAI_API_KEY"),
+    )
+
+
+@register_backend("huggingface")
+def initialize_huggingface_llm():
+    from langchain.llms import HuggingFacePipeline
+    from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+
+    # Use a higher-accuracy model tailored for your RTX 3050 Ti (e.g. EleutherAI/gpt-neo-2.7B)
+    model_name = os.getenv("QUIZ_HF_MODEL", "EleutherAI/gpt-neo-2.7B")
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForCausalLM.from_pretrained(model_name)
+    hf_pipeline = pipeline("text-generation", model=model, tokenizer=tokenizer, max_length=1024)
+    return CompletionChatModel(HuggingFacePipeline(pipeline=hf_pipeline))
+
+
+class TextMessage(NamedTuple):
+    """Minimal stand-in for a LangChain message: backends return ``.content``."""
+    content: str
+
+
+class CompletionChatModel:
+    """Chat interface over a LangChain text-completion LLM.
+
+    Completion models such as ``HuggingFacePipeline`` take one prompt string
+    and return a plain ``str``, so the messages are rendered as a transcript
+    and the reply is wrapped in a ``TextMessage``.
+    """
+
+    def __init__(self, llm):
+        self.llm = llm
+
+    @staticmethod
+    def render(messages) -> str:
+        turns = "\n\n".join(f"{message['role'].capitalize()}: {message['content']}" for message in messages)
+        return f"{turns}\n\nAssistant:"
+
+    def invoke(self, messages) -> TextMessage:
+        return TextMessage(self.llm.invoke(self.render(messages)))
+
+
+class FakeLLMError(RuntimeError):
+    """Simulated provider failure raised by ``FakeChatModel``."""
+
+
+MALFORMED_KINDS = ("truncated", "prose", "bad_question", "not_json")
+
+
+class FakeChatModel:
+    """Offline backend that answers quiz and matching-game prompts with placeholders.
+
+    It reads the topic and question count from the prompt and replies in the
+    output format the system message asks for, so the whole pipeline can run
+    without network access. For benchmarks it can also act like a real
+    provider. The time to first token is log-normal around ``latency``, with
+    ``latency_jitter`` as sigma. Output is paced at ``tokens_per_second``.
+    ``error_rate`` and ``malformed_rate`` set the fraction of calls that fail
+    or return broken output. Random draws are seeded from ``seed``, the prompt
+    and how often that prompt was seen, so a run replays the same way
+    whatever order concurrent calls happen in.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        tokens_per_second: float = 0.0,
+        error_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.seed = seed
+        self._seen: Dict[int, int] = {}
+
+    def _reply(self, messages, broken_question: bool = False) -> str:
+        prompt = messages[-1]["content"]
+        match = re.search(r"matching game about (.+?) with (\d+) pairs", prompt)
+        if match:
+            topic = match.group(1)
+            pairs = [
+                {"term": f"{topic} term {i}", "image_prompt": f"A picture of {topic} term {i}", "explanation": f"Term {i} of {topic}."}
+                for i in range(1, int(match.group(2)) + 1)
+            ]
+            return json.dumps({"title": f"{topic} Matching Game", "description": f"A matching game about {topic}", "pairs": pairs})
+        match = re.search(r"quiz about (.+?) with (\d+) multiple choice", prompt)
+        topic, count = (match.group(1), int(match.group(2))) if match else ("general knowledge", 5)
+        questions = [
+            [f"Sample question {i} about {topic}?", [f"Answer {i}", "Option B", "Option C", "Option D"], 0, f"Answer {i} is correct."]
+            for i in range(1, count + 1)
+        ]
+        if broken_question:
+            questions[0][1] = questions[0][1][:3]
+        if "compact JSON" in messages[0]["content"]:
+            return json.dumps({"t": f"{topic} Quiz", "d": f"A quiz about {topic}", "q": questions})
+        return json.dumps({
+            "title": f"{topic} Quiz",
+            "description": f"A quiz about {topic}",
+            "questions": [
+                {"id": i, "question": q, "options": o, "correct_answer": a, "explanation": e}
+                for i, (q, o, a, e) in enumerate(questions, 1)
+            ],
+        })
+
+    def _plan(self, messages):
+        """Draw this call's time to first token and its output (None for an error)."""
+        key = zlib.crc32(messages[-1]["content"].encode())
+        seen = self._seen.get(key, 0)
+        self._seen[key] = seen + 1
+        rng = random.Random(f"{self.seed}:{key}:{seen}")
+        delay = self.latency * math.exp(rng.gauss(0, self.latency_jitter)) if self.latency_jitter else self.latency
+        if rng.random() < self.error_rate:
+            return delay, None
+        if rng.random() >= self.malformed_rate:
+            return delay, self._reply(messages)
+        kind = rng.choice(MALFORMED_KINDS)
+        if kind == "bad_question":
+            return delay, self._reply(messages, broken_question=True)
+        if kind == "not_json":
+            return delay, "I'm sorry, I can't produce a quiz about that right now."
+        text = self._reply(messages)
+        if kind == "prose":
+            return delay, f"Sure! Here is your quiz:\n{text}\nGood luck!"
+        return delay, text[:rng.randint(len(text) // 2, len(text) - 1)]
+
+    def _generation_time(self, text: str) -> float:
+        return math.ceil(len(text) / 4) / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def invoke(self, messages) -> TextMessage:
+        delay, text = self._plan(messages)
+        time.sleep(delay + (self._generation_time(text) if text is not None else 0.0))
+        if text is None:
+            raise FakeLLMError("Simulated LLM failure")
+        return TextMessage(text)
+
+    async def ainvoke(self, messages) -> TextMessage:
+        delay, text = self._plan(messages)
+        await asyncio.sleep(delay + (self._generation_time(text) if text is not None else 0.0))
+        if text is None:
+            raise FakeLLMError("Simulated LLM failure")
+        return TextMessage(text)
+
+    async def astream(self, messages):
+        delay, text = self._plan(messages)
+        await asyncio.sleep(delay)
+        if text is None:
+            raise FakeLLMError("Simulated LLM failure")
+        for start in range(0, len(text), 16):
+            chunk = text[start:start + 16]
+            await asyncio.sleep(self._generation_time(chunk))
+            yield TextMessage(chunk)
+
+
+@register_backend("fake")
+def initialize_fake_llm():
+    return FakeChatModel(
+        latency=float(os.getenv("QUIZ_FAKE_LATENCY", "0")),
+        latency_jitter=float(os.getenv("QUIZ_FAKE_LATENCY_JITTER", "0")),
+        tokens_per_second=float(os.getenv("QUIZ_FAKE_TOKENS_PER_SECOND", "0")),
+        error_rate=float(os.getenv("QUIZ_FAKE_ERROR_RATE", "0")),
+        malformed_rate=float(os.getenv("QUIZ_FAKE_MALFORMED_RATE", "0")),
+        seed=int(os.getenv("QUIZ_FAKE_SEED", "0")),
+    )
+
+
+@register_backend("local")
+def initialize_local_llm():
+    from local_inference import LocalChatModel
+
+    return LocalChatModel(
+        os.getenv("QUIZ_LOCAL_MODEL", "Qwen/Qwen2.5-0.5B-Instruct"),
+        workers=int(os.getenv("QUIZ_LOCAL_WORKERS", "1")),
+        max_batch_size=int(os.getenv("QUIZ_LOCAL_MAX_BATCH_SIZE", "8")),
+        max_wait=float(os.getenv("QUIZ_LOCAL_MAX_WAIT_MS", "20")) / 1000,
+        max_new_tokens=int(os.getenv("QUIZ_LOCAL_MAX_NEW_TOKENS", "1024")),
+    )
+
+
+@register_backend("router")
+def initialize_router_llm():
+    from llm_router import LLMRouter
+
+    return LLMRouter.from_config(
+        json.loads(os.getenv("QUIZ_ROUTER_ENDPOINTS", "[]")),
+        hedge=os.getenv("QUIZ_ROUTER_HEDGE", "1") == "1",
+        hedge_percentile=float(os.getenv("QUIZ_ROUTER_HEDGE_PERCENTILE", "95")),
+        hedge_min_delay=float(os.getenv("QUIZ_ROUTER_HEDGE_MIN_DELAY", "0.5")),
+    )
+
+
+def create_backend(name: str):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend {name!r}; choose from {sorted(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+class LazyBackend:
+    """Builds the named backend once, off the event loop, on first use.
+
+    A failed build is remembered for ``/ready`` and retried on the next call.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.error = None
+        self._llm = None
+        self._loading = None
+
+    @property
+    def ready(self) -> bool:
+        return self._llm is not None
+
+    async def get(self):
+        if self._llm is not None:
+            return self._llm
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(self._load())
+        loading = self._loading
+        try:
+            return await asyncio.shield(loading)
+        finally:
+            if loading.done() and not loading.cancelled() and loading.exception() is not None and self._loading is loading:
+                self._loading = None
+
+    async def _load(self):
+        try:
+            self._llm = await asyncio.get_running_loop().run_in_executor(None, create_backend, self.name)
+        except Exception as e:
+            self.error = str(e)
+            raise
+        self.error = None
+        return self._llm
+
+    def stats(self) -> Optional[dict]:
+        """The backend's own counters, for backends that keep any."""
+        if self._llm is not None and hasattr(self._llm, "stats"):
+            return self._llm.stats()
+        return None
+
+    async def close(self) -> None:
+        if self._llm is None:
+            return
+        if hasattr(self._llm, "aclose"):
+            await self._llm.aclose()
+        elif hasattr(self._llm, "close"):
+            self._llm.close()
+
+    async def warm_up(self) -> None:
+        try:
+            await self.get()
+        except Exception as e:
+            log_event("llm_backend_error", backend=self.name, error=str(e))
@@ -0,0 +1,272 @@
+"""Latency-aware routing across several OpenAI-compatible endpoints.
+
+Each ``Endpoint`` talks to one ``/chat/completions`` API (OpenAI in some
+region, a self-hosted vLLM or llama.cpp server, ...) through its own
+keep-alive connection pool. It tracks an EWMA of call latency and the calls
+it has in flight. ``LLMRouter`` sends each call to the endpoint with the
+lowest expected wait, ``ewma * (in_flight + 1)``. Endpoints without
+measurements are tried first, and an endpoint that just failed sits out for
+a cooldown.
+
+With hedging on, a call still running after the chosen endpoint's
+``hedge_percentile`` latency is also sent to the next best endpoint, and the
+first answer wins. A call that fails is retried once on another endpoint.
+
+Endpoints are configured as a JSON list in ``QUIZ_ROUTER_ENDPOINTS``:
+
+    [{"name": "us", "base_url": "https://api.openai.com/v1", "model": "gpt-4o-mini", "api_key_env": "OPENAI_API_KEY"},
+     {"name": "local", "base_url": "http://gpu-box:8000/v1", "model": "Qwen/Qwen2.5-7B-Instruct", "max_connections": 32}]
+"""
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import List, Optional
+
+import httpx
+
+from llm_backends import TextMessage
+
+
+class EndpointError(RuntimeError):
+    pass
+
+
+class Endpoint:
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        model: str,
+        api_key: Optional[str] = None,
+        max_connections: int = 16,
+        timeout: float = 60.0,
+        temperature: float = 0.2,
+        ewma_alpha: float = 0.3,
+        cooldown: float = 5.0,
+    ):
+        self.name = name
+        self.model = model
+        self.temperature = temperature
+        self.ewma_alpha = ewma_alpha
+        self.cooldown = cooldown
+        self.ewma: Optional[float] = None
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=256)
+        self._failed_at = None
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        # One client per endpoint keeps its connections alive between calls.
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            headers=headers,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    @property
+    def available(self) -> bool:
+        return self._failed_at is None or time.monotonic() - self._failed_at >= self.cooldown
+
+    def expected_wait(self) -> float:
+        # Unmeasured endpoints sort first, least loaded first, so every endpoint
+        # gets a latency estimate.
+        if self.ewma is None:
+            return -1.0 / (self.in_flight + 1)
+        return self.ewma * (self.in_flight + 1)
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        if len(self.latencies) < 10:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+    def _record(self, seconds: Optional[float]) -> None:
+        if seconds is None:
+            self.errors += 1
+            self._failed_at = time.monotonic()
+            return
+        self._failed_at = None
+        self.latencies.append(seconds)
+        self.ewma = seconds if self.ewma is None else self.ewma_alpha * seconds + (1 - self.ewma_alpha) * self.ewma
+
+    def _payload(self, messages: List[dict], stream: bool = False) -> dict:
+        return {"model": self.model, "messages": messages, "temperature": self.temperature, "stream": stream}
+
+    def start(self, messages: List[dict]) -> asyncio.Task:
+        """Start a completion in a task, counted as in flight from this moment.
+
+        Counting it before the task first runs keeps calls picked in the same
+        event-loop tick from all seeing this endpoint idle.
+        """
+        self.in_flight += 1
+        self.calls += 1
+        task = asyncio.ensure_future(self._complete(messages))
+        task.add_done_callback(self._finished)
+        return task
+
+    async def complete(self, messages: List[dict]) -> str:
+        return await self.start(messages)
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self.in_flight -= 1
+
+    async def _complete(self, messages: List[dict]) -> str:
+        started = time.perf_counter()
+        try:
+            response = await self.client.post("/chat/completions", json=self._payload(messages))
+            if response.status_code != 200:
+                raise EndpointError(f"{self.name}: HTTP {response.status_code}: {response.text[:200]}")
+            content = response.json()["choices"][0]["message"]["content"]
+        except asyncio.CancelledError:
+            # A call cancelled after losing a hedge race is neither a failure nor a sample.
+            raise
+        except Exception:
+            self._record(None)
+            raise
+        self._record(time.perf_counter() - started)
+        return content
+
+    async def stream(self, messages: List[dict]):
+        """Yield content deltas from a server-sent-events completion."""
+        self.in_flight += 1
+        self.calls += 1
+        started = time.perf_counter()
+        try:
+            async with self.client.stream("POST", "/chat/completions", json=self._payload(messages, stream=True)) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    raise EndpointError(f"{self.name}: HTTP {response.status_code}: {response.text[:200]}")
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+        except Exception:
+            self._record(None)
+            raise
+        finally:
+            self.in_flight -= 1
+        self._record(time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        return {
+            "ewma_seconds": self.ewma,
+            "p95_seconds": self.latency_percentile(95),
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "errors": self.errors,
+            "available": self.available,
+        }
+
+
+class LLMRouter:
+    """Chat-model interface (``ainvoke``/``astream``) over several endpoints."""
+
+    def __init__(self, endpoints: List[Endpoint], hedge: bool = True, hedge_percentile: float = 95.0, hedge_min_delay: float = 0.5):
+        if not endpoints:
+            raise ValueError("LLMRouter needs at least one endpoint")
+        self.endpoints = endpoints
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    @classmethod
+    def from_config(cls, config: List[dict], **kwargs):
+        endpoints = []
+        for i, entry in enumerate(config):
+            api_key_env = entry.get("api_key_env")
+            endpoints.append(Endpoint(
+                name=entry.get("name", f"endpoint-{i}"),
+                base_url=entry["base_url"],
+                model=entry["model"],
+                api_key=entry.get("api_key") or (os.getenv(api_key_env) if api_key_env else None),
+                max_connections=entry.get("max_connections", 16),
+                timeout=entry.get("timeout", 60.0),
+                temperature=entry.get("temperature", 0.2),
+            ))
+        return cls(endpoints, **kwargs)
+
+    def pick(self, exclude=()) -> Optional[Endpoint]:
+        candidates = [e for e in self.endpoints if e not in exclude]
+        available = [e for e in candidates if e.available] or candidates
+        return min(available, key=Endpoint.expected_wait, default=None)
+
+    def _hedge_delay(self, endpoint: Endpoint) -> Optional[float]:
+        if not self.hedge or len(self.endpoints) < 2:
+            return None
+        threshold = endpoint.latency_percentile(self.hedge_percentile)
+        return max(threshold, self.hedge_min_delay) if threshold is not None else None
+
+    async def _complete(self, messages: List[dict]) -> str:
+        primary = self.pick()
+        tried = [primary]
+        first = primary.start(messages)
+        delay = self._hedge_delay(primary)
+        pending = {first}
+        error = None
+        # Cancelling the caller, at any await below, cancels every attempt.
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    backup = self.pick(exclude=tried)
+                    tried.append(backup)
+                    self.hedged += 1
+                    pending.add(backup.start(messages))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        # Every attempt failed; fail over once to the best endpoint not tried yet.
+        failover = self.pick(exclude=tried)
+        if failover is None:
+            raise error
+        self.failovers += 1
+        return await failover.complete(messages)
+
+    async def ainvoke(self, messages: List[dict]) -> TextMessage:
+        return TextMessage(await self._complete(messages))
+
+    async def astream(self, messages: List[dict]):
+        endpoint = self.pick()
+        started = False
+        try:
+            async for delta in endpoint.stream(messages):
+                started = True
+                yield TextMessage(delta)
+            return
+        except (httpx.HTTPError, EndpointError):
+            if started or len(self.endpoints) < 2:
+                raise
+        # Nothing was sent yet, so the whole stream can move to another endpoint.
+        self.failovers += 1
+        async for delta in self.pick(exclude=(endpoint,)).stream(messages):
+            yield TextMessage(delta)
+
+    def stats(self) -> dict:
+        return {
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "endpoints": {endpoint.name: endpoint.stats() for endpoint in self.endpoints},
+        }
+
+    async def aclose(self) -> None:
+        await asyncio.gather(*(endpoint.client.aclose() for endpoint in self.endpoints))
@@ -0,0 +1,211 @@
+"""Local Hugging Face inference with dynamic batching.
+
+Prompts from concurrent requests are collected by ``DynamicBatcher`` for up to
+``max_wait`` seconds or ``max_batch_size`` prompts, whichever comes first, and
+each batch is generated in one ``model.generate`` call in a worker process.
+Every worker loads the model once, when it starts. Generation runs on CPU, so
+this backend works offline as a backup to the hosted models.
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, List
+
+from llm_backends import TextMessage
+
+# Set in each worker process by _load_model.
+_model = None
+_tokenizer = None
+
+
+def _load_model(model_name: str, num_threads: int) -> None:
+    global _model, _tokenizer
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    torch.set_num_threads(num_threads)
+    # Left padding keeps every prompt in a batch ending at the same position,
+    # so the generated tokens can be sliced off in one step.
+    _tokenizer = AutoTokenizer.from_pretrained(model_name, padding_side="left")
+    if _tokenizer.pad_token is None:
+        _tokenizer.pad_token = _tokenizer.eos_token
+    _model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float32)
+    _model.eval()
+
+
+def _format_prompt(messages: List[dict]) -> str:
+    if getattr(_tokenizer, "chat_template", None):
+        return _tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+    return "\n\n".join(message["content"] for message in messages) + "\n"
+
+
+def _generate_batch(conversations: List[List[dict]], max_new_tokens: int) -> List[str]:
+    import torch
+
+    inputs = _tokenizer([_format_prompt(messages) for messages in conversations], return_tensors="pt", padding=True)
+    with torch.inference_mode():
+        output = _model.generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            do_sample=False,
+            pad_token_id=_tokenizer.pad_token_id,
+        )
+    return _tokenizer.batch_decode(output[:, inputs["input_ids"].shape[1]:], skip_special_tokens=True)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+class DynamicBatcher:
+    """Groups concurrent submissions into batches run on an executor.
+
+    ``batch_fn`` receives a list of items and must return one result per item.
+    At most ``max_concurrent_batches`` batches run at once; items that arrive
+    meanwhile wait in the queue and form the next batch.
+    """
+
+    def __init__(
+        self,
+        executor: Executor,
+        batch_fn: Callable[[list], list],
+        max_batch_size: int = 8,
+        max_wait: float = 0.02,
+        max_concurrent_batches: int = 1,
+    ):
+        self.executor = executor
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_concurrent_batches = max_concurrent_batches
+        self.batches = 0
+        self.items = 0
+        self._queue = None
+        self._slots = None
+        self._runner = None
+        self._dispatching = set()
+        self._pending = set()
+        self._closed = False
+
+    def _start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._runner = asyncio.create_task(self._run())
+
+    async def submit(self, item):
+        if self._closed:
+            raise RuntimeError("DynamicBatcher is closed")
+        if self._runner is None or self._runner.done():
+            self._start()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        await self._queue.put((item, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatching.add(task)
+            task.add_done_callback(self._dispatching.discard)
+
+    async def _dispatch(self, batch) -> None:
+        live = [(item, future) for item, future in batch if not future.done()]
+        try:
+            if not live:
+                return
+            self.batches += 1
+            self.items += len(live)
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.batch_fn, [item for item, _ in live]
+            )
+            for (_, future), result in zip(live, results):
+                if not future.done():
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in live:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        """Stop batching and fail every submission still waiting for a result.
+
+        Batches already handed to the executor are abandoned, not waited for.
+        """
+        self._closed = True
+        for task in [self._runner, *self._dispatching]:
+            if task is not None:
+                task.cancel()
+        error = RuntimeError("DynamicBatcher closed before the batch finished")
+        for future in list(self._pending):
+            if not future.done():
+                future.set_exception(error)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "prompts": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+class LocalChatModel:
+    """Chat-model interface (``ainvoke``) over a pool of batching CPU workers."""
+
+    def __init__(
+        self,
+        model_name: str,
+        workers: int = 1,
+        max_batch_size: int = 8,
+        max_wait: float = 0.02,
+        max_new_tokens: int = 1024,
+        threads_per_worker: int = 0,
+        batch_fn: Callable = _generate_batch,
+        initializer: Callable = _load_model,
+    ):
+        threads = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        self.model_name = model_name
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initializer,
+            initargs=(model_name, threads),
+        )
+        # Start every worker now so the model is loaded before the backend reports ready.
+        for future in [self._executor.submit(_ping) for _ in range(workers)]:
+            future.result()
+        self.batcher = DynamicBatcher(
+            self._executor,
+            functools.partial(batch_fn, max_new_tokens=max_new_tokens),
+            max_batch_size=max_batch_size,
+            max_wait=max_wait,
+            max_concurrent_batches=workers,
+        )
+
+    async def ainvoke(self, messages: List[dict]) -> TextMessage:
+        return TextMessage(await self.batcher.submit(messages))
+
+    def stats(self) -> dict:
+        return self.batcher.stats()
+
+    def close(self) -> None:
+        # Called on the event loop, so do not wait for a batch still generating.
+        self.batcher.close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,73 @@
+"""Prompt and parsing for matching-game sets.
+
+A matching game is a list of pairs of a term, a prompt for the image the
+player matches it with, and an explanation shown afterwards, in the format of
+``historical_events_matching_game.json``. Like quiz prompts, the system
+message is fixed so provider-side prefix caching can reuse it.
+"""
+import json
+from typing import List
+
+from quiz_prompts import QuizPrompt, count_tokens
+
+MATCHING_SYSTEM_PROMPT = """You write matching games as JSON.
+Each pair has a term, a prompt for an illustration of the term and a short explanation.
+Do NOT include any text before or after the JSON.
+Return ONLY the JSON object with this exact structure:
+{
+    "title": "Game Title",
+    "description": "Game description",
+    "pairs": [
+        {
+            "term": "A person, event, place or concept",
+            "image_prompt": "A concrete description of a picture of the term, without any text or labels in it",
+            "explanation": "One or two sentences about the term."
+        }
+    ]
+}
+
+Requirements:
+- Every term must be distinct and clearly recognizable from its picture.
+- Image prompts describe a scene, not the term's name.
+- Ensure the JSON is valid.
+"""
+
+PAIR_FIELDS = ("term", "image_prompt", "explanation")
+
+
+def build_matching_prompt(topic: str, num_pairs: int) -> QuizPrompt:
+    user = f"Now, generate a matching game about {topic} with {num_pairs} pairs.\n"
+    messages = [{"role": "system", "content": MATCHING_SYSTEM_PROMPT}, {"role": "user", "content": user}]
+    return QuizPrompt(messages, count_tokens(MATCHING_SYSTEM_PROMPT) + count_tokens(user))
+
+
+def validate_pairs(raw_pairs) -> List[dict]:
+    """Keep well-formed pairs with distinct terms, numbered from 1."""
+    pairs, seen = [], set()
+    for raw in raw_pairs if isinstance(raw_pairs, list) else []:
+        if not isinstance(raw, dict) or not all(isinstance(raw.get(key), str) and raw[key].strip() for key in PAIR_FIELDS):
+            continue
+        term = raw["term"].strip()
+        if term.lower() in seen:
+            continue
+        seen.add(term.lower())
+        pairs.append({"id": len(pairs) + 1, **{key: raw[key].strip() for key in PAIR_FIELDS}})
+    return pairs
+
+
+def parse_matching_game(text: str, topic: str) -> dict:
+    obj = json.loads(text)
+    pairs = validate_pairs(obj.get("pairs"))
+    if not pairs:
+        raise ValueError("No valid pairs in LLM output")
+    return {
+        "title": obj.get("title") or f"{topic} Matching Game",
+        "description": obj.get("description") or f"Match each {topic} term with its picture",
+        "pairs": pairs,
+    }
+
+
+def load_matching_game(path: str, title: str, description: str) -> dict:
+    """A hand-written game in the ``historical_events_matching_game.json`` format."""
+    with open(path, encoding="utf-8") as f:
+        return {"title": title, "description": description, "pairs": validate_pairs(json.load(f))}
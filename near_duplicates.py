@@ -0,0 +1,207 @@
+"""Near-duplicate detection for quiz questions.
+
+Question text is reduced to character 3-gram shingles and summarized by
+MinHash signatures computed in batches with NumPy. Locality-sensitive hashing
+over signature bands narrows each lookup to a few candidates, so checks stay
+fast with hundreds of thousands of stored questions.
+
+Two questions are near-duplicates when their wording is similar *and* their
+correct answers match. The answer check keeps "symbol for gold?" and "symbol
+for silver?" apart, while rewordings such as "When did World War II end?" and
+"When did WWII end?" still collide.
+"""
+import re
+import zlib
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+_HASH_SHIFT = np.uint64(32)
+_BAND_PRIME = np.uint64(0x100000001B3)
+_SIGNATURE_BATCH = 512
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def _shingle_batch(texts: Sequence[str]):
+    """Character 3-grams of every text, concatenated, plus each text's offset.
+
+    Grams are packed into integers. Repeated grams are left in place since
+    they do not change a minimum.
+    """
+    encoded = [_normalize(text).encode("utf-8").ljust(3, b"\0") for text in texts]
+    lengths = np.fromiter((len(e) for e in encoded), dtype=np.int64, count=len(encoded))
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+    grams = (data[:-2] << np.uint64(16)) | (data[1:-1] << np.uint64(8)) | data[2:]
+    # Drop the grams that straddle two texts.
+    ends = np.cumsum(lengths)
+    keep = np.ones(len(grams), dtype=bool)
+    straddling = np.concatenate([ends - 2, ends - 1])
+    keep[straddling[straddling < len(grams)]] = False
+    offsets = np.concatenate([[0], np.cumsum(lengths - 2)[:-1]])
+    return grams[keep], offsets
+
+
+def answer_hash(answer: str) -> int:
+    return zlib.crc32(_normalize(answer).encode("utf-8"))
+
+
+def question_answer(question: dict) -> str:
+    """The text of the correct option, or an empty string if it is out of range."""
+    options = question.get("options", [])
+    index = question.get("correct_answer")
+    return str(options[index]) if isinstance(index, int) and 0 <= index < len(options) else ""
+
+
+class MinHasher:
+    """Computes MinHash signatures with a fixed set of random hash functions."""
+
+    def __init__(self, num_perm: int = 72, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        # Multiply-shift hashing: odd 64-bit multipliers, wrapping arithmetic,
+        # keep the high 32 bits.
+        self._a = rng.randint(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.randint(0, np.iinfo(np.uint64).max, size=num_perm, dtype=np.uint64)
+
+    def signatures(self, texts: Sequence[str]) -> np.ndarray:
+        result = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        for start in range(0, len(texts), _SIGNATURE_BATCH):
+            grams, offsets = _shingle_batch(texts[start:start + _SIGNATURE_BATCH])
+            hashed = (self._a[:, None] * grams[None, :] + self._b[:, None]) >> _HASH_SHIFT
+            result[start:start + len(offsets)] = np.minimum.reduceat(hashed, offsets, axis=1).T
+        return result
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index that rejects questions too similar to ones already seen.
+
+    ``threshold`` is the estimated Jaccard similarity of question wording above
+    which two questions with the same answer count as duplicates. With the
+    default 24 bands of 3 rows, pairs at 0.45 similarity are found as
+    candidates about 90% of the time and unrelated text rarely is.
+
+    Band keys live in NumPy arrays: a per-band sorted run searched with
+    ``searchsorted`` plus a short unsorted tail of recent additions, merged
+    back into the sorted run as it grows.
+    """
+
+    def __init__(self, threshold: float = 0.45, num_perm: int = 72, bands: int = 24, hasher: Optional[MinHasher] = None):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.hasher = hasher or MinHasher(num_perm)
+        self._rows = num_perm // bands
+        self._size = 0
+        self._signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._answers = np.empty(0, dtype=np.uint32)
+        self._keys = np.empty((0, bands), dtype=np.uint64)
+        self._sorted = 0
+        self._sorted_keys = np.empty((bands, 0), dtype=np.uint64)
+        self._sorted_rows = np.empty((bands, 0), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        bands = signatures.reshape(len(signatures), self.bands, self._rows).astype(np.uint64)
+        keys = np.zeros(bands.shape[:2], dtype=np.uint64)
+        for row in range(self._rows):
+            keys = (keys ^ bands[:, :, row]) * _BAND_PRIME
+        return keys
+
+    def _candidates(self, keys: np.ndarray) -> np.ndarray:
+        found = []
+        for band in range(self.bands):
+            column = self._sorted_keys[band]
+            lo = np.searchsorted(column, keys[band], side="left")
+            hi = np.searchsorted(column, keys[band], side="right")
+            if hi > lo:
+                found.append(self._sorted_rows[band, lo:hi])
+        tail = self._keys[self._sorted:self._size]
+        found.append(np.flatnonzero((tail == keys).any(axis=1)) + self._sorted)
+        return np.unique(np.concatenate(found))
+
+    def _is_duplicate(self, signature: np.ndarray, keys: np.ndarray, answer: int) -> bool:
+        rows = self._candidates(keys)
+        rows = rows[self._answers[rows] == answer]
+        if not len(rows):
+            return False
+        return bool(((self._signatures[rows] == signature).mean(axis=1) >= self.threshold).any())
+
+    def _reserve(self, count: int) -> None:
+        needed = self._size + count
+        if needed <= len(self._signatures):
+            return
+        capacity = max(64, needed, 2 * len(self._signatures))
+        for name in ("_signatures", "_answers", "_keys"):
+            old = getattr(self, name)
+            grown = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            grown[:self._size] = old[:self._size]
+            setattr(self, name, grown)
+
+    def _store(self, signatures: np.ndarray, keys: np.ndarray, answers: np.ndarray) -> None:
+        self._reserve(len(signatures))
+        end = self._size + len(signatures)
+        self._signatures[self._size:end] = signatures
+        self._keys[self._size:end] = keys
+        self._answers[self._size:end] = answers
+        self._size = end
+        if self._size - self._sorted > max(256, self._sorted // 8):
+            order = np.argsort(self._keys[:self._size], axis=0, kind="stable").T
+            self._sorted_rows = order
+            self._sorted_keys = np.take_along_axis(self._keys[:self._size].T, order, axis=1)
+            self._sorted = self._size
+
+    def _answer_hashes(self, answers: Optional[Iterable[str]], count: int) -> np.ndarray:
+        if answers is None:
+            return np.zeros(count, dtype=np.uint32)
+        return np.fromiter((answer_hash(a) for a in answers), dtype=np.uint32, count=count)
+
+    def add(self, texts: Iterable[str], answers: Optional[Iterable[str]] = None) -> List[bool]:
+        """Index each question unless it duplicates an earlier one.
+
+        Returns a flag per question telling whether it was new. Questions earlier
+        in the same batch count, so a batch is de-duplicated against itself too.
+        """
+        texts = list(texts)
+        answer_hashes = self._answer_hashes(answers, len(texts))
+        signatures = self.hasher.signatures(texts)
+        keys = self._band_keys(signatures)
+        flags = []
+        for i in range(len(texts)):
+            new = not self._is_duplicate(signatures[i], keys[i], answer_hashes[i])
+            if new:
+                self._store(signatures[i:i + 1], keys[i:i + 1], answer_hashes[i:i + 1])
+            flags.append(new)
+        return flags
+
+    def extend(self, texts: Sequence[str], answers: Optional[Iterable[str]] = None) -> None:
+        """Bulk-index questions already known to be distinct, without checking."""
+        signatures = self.hasher.signatures(texts)
+        self._store(signatures, self._band_keys(signatures), self._answer_hashes(answers, len(texts)))
+
+    def contains(self, texts: Iterable[str], answers: Optional[Iterable[str]] = None) -> List[bool]:
+        """Check questions against the index without adding them."""
+        texts = list(texts)
+        answer_hashes = self._answer_hashes(answers, len(texts))
+        signatures = self.hasher.signatures(texts)
+        keys = self._band_keys(signatures)
+        return [self._is_duplicate(signatures[i], keys[i], answer_hashes[i]) for i in range(len(texts))]
+
+    def add_questions(self, questions: Sequence[dict]) -> List[bool]:
+        return self.add([q["question"] for q in questions], [question_answer(q) for q in questions])
+
+
+def dedupe_questions(questions: Iterable[dict], index: Optional[NearDuplicateIndex] = None) -> List[dict]:
+    """Drop near-duplicate questions, keeping the first of each group.
+
+    Pass an existing index to also reject questions similar to ones it holds;
+    the kept questions are added to it.
+    """
+    questions = list(questions)
+    flags = (index or NearDuplicateIndex()).add_questions(questions)
+    return [q for q, keep in zip(questions, flags) if keep]
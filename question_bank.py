@@ -0,0 +1,188 @@
+"""Persistent bank of validated quiz questions.
+
+Every question that passes validation is stored here, indexed by normalized
+topic and difficulty, so later quizzes can be assembled from the bank and the
+LLM is only asked for the questions the bank cannot supply. Near-duplicates of
+stored questions are rejected on insert, so sampled quizzes never repeat a
+question in different words.
+
+Async code uses the ``a``-prefixed methods, which run in a worker thread:
+sampling, search and the first near-duplicate check for a topic can take
+seconds on a large bank.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from typing import Iterable, List
+
+from near_duplicates import NearDuplicateIndex, question_answer
+from quiz_cache import normalize_key, normalize_topic
+
+
+class QuestionBank:
+    """SQLite-backed question store with full-text search on question text."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._duplicate_indexes = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY,
+                topic TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                question TEXT NOT NULL,
+                options TEXT NOT NULL,
+                correct_answer INTEGER NOT NULL,
+                explanation TEXT NOT NULL,
+                UNIQUE (topic, difficulty, question)
+            );
+            CREATE INDEX IF NOT EXISTS questions_topic_difficulty ON questions (topic, difficulty);
+            CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+                question, content='questions', content_rowid='id'
+            );
+            CREATE TRIGGER IF NOT EXISTS questions_fts_insert AFTER INSERT ON questions BEGIN
+                INSERT INTO questions_fts (rowid, question) VALUES (new.id, new.question);
+            END;
+            CREATE TRIGGER IF NOT EXISTS questions_fts_delete AFTER DELETE ON questions BEGIN
+                INSERT INTO questions_fts (questions_fts, rowid, question) VALUES ('delete', old.id, old.question);
+            END;
+            """
+        )
+        self._conn.commit()
+
+    def _duplicate_index(self, key) -> NearDuplicateIndex:
+        """The near-duplicate index for one topic and difficulty, built on first use."""
+        index = self._duplicate_indexes.get(key)
+        if index is None:
+            rows = self._conn.execute(
+                "SELECT question, options, correct_answer FROM questions WHERE topic = ? AND difficulty = ?", key
+            ).fetchall()
+            index = NearDuplicateIndex()
+            index.extend(
+                [row[0] for row in rows],
+                [question_answer({"options": json.loads(row[1]), "correct_answer": row[2]}) for row in rows],
+            )
+            self._duplicate_indexes[key] = index
+        return index
+
+    def add_questions(self, topic: str, difficulty: str, questions: Iterable[dict]) -> int:
+        """Store questions, skipping near-duplicates. Returns how many were new."""
+        key = normalize_key(topic, difficulty)
+        questions = list(questions)
+        with self._lock:
+            keep = self._duplicate_index(key).add_questions(questions)
+            rows = [
+                (*key, q["question"], json.dumps(q["options"]), q["correct_answer"], q["explanation"])
+                for q, new in zip(questions, keep)
+                if new
+            ]
+            # rowcount, unlike total_changes, leaves out the full-text index rows the trigger writes.
+            cursor = self._conn.executemany(
+                """
+                INSERT OR IGNORE INTO questions (topic, difficulty, question, options, correct_answer, explanation)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def count(self, topic: str, difficulty: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM questions WHERE topic = ? AND difficulty = ?", normalize_key(topic, difficulty)
+            ).fetchone()[0]
+
+    def sample(self, topic: str, difficulty: str, num_questions: int) -> List[dict]:
+        """Pick up to num_questions distinct random questions, numbered from 1."""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT question, options, correct_answer, explanation FROM questions
+                WHERE topic = ? AND difficulty = ? ORDER BY RANDOM() LIMIT ?
+                """,
+                (*normalize_key(topic, difficulty), num_questions),
+            ).fetchall()
+        return [_row_to_question(i + 1, row) for i, row in enumerate(rows)]
+
+    def search(self, text: str, topic: str = None, limit: int = 20) -> List[dict]:
+        """Full-text search over question text, optionally within one topic."""
+        query = " ".join(f'"{term}"' for term in text.replace('"', " ").split())
+        if not query:
+            return []
+        sql = """
+            SELECT q.question, q.options, q.correct_answer, q.explanation FROM questions_fts
+            JOIN questions q ON q.id = questions_fts.rowid
+            WHERE questions_fts MATCH ?
+        """
+        params = [query]
+        if topic is not None:
+            sql += " AND q.topic = ?"
+            params.append(normalize_topic(topic))
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [_row_to_question(i + 1, row) for i, row in enumerate(rows)]
+
+    async def aadd_questions(self, topic: str, difficulty: str, questions: List[dict]) -> int:
+        return await _in_thread(self.add_questions, topic, difficulty, questions)
+
+    async def asample(self, topic: str, difficulty: str, num_questions: int) -> List[dict]:
+        return await _in_thread(self.sample, topic, difficulty, num_questions)
+
+    async def asearch(self, text: str, topic: str = None, limit: int = 20) -> List[dict]:
+        return await _in_thread(self.search, text, topic, limit)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+            topics = self._conn.execute("SELECT COUNT(DISTINCT topic) FROM questions").fetchone()[0]
+        return {"questions": total, "topics": topics}
+
+
+async def _in_thread(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+def _row_to_question(question_id: int, row) -> dict:
+    question, options, correct_answer, explanation = row
+    return {
+        "id": question_id,
+        "question": question,
+        "options": json.loads(options),
+        "correct_answer": correct_answer,
+        "explanation": explanation,
+    }
+
+
+def seed_question_bank(bank: QuestionBank, fallback_quizzes: dict, quiz_data_path: str = "quiz-data.json") -> int:
+    """Load the built-in fallback quizzes and quiz-data.json into the bank.
+
+    The built-in questions have no difficulty of their own and are filed as
+    medium. Returns the number of questions that were not already stored.
+    """
+    added = 0
+    for topic, questions in fallback_quizzes.items():
+        added += bank.add_questions(topic, "medium", questions)
+    if os.path.exists(quiz_data_path):
+        with open(quiz_data_path, encoding="utf-8") as f:
+            quiz_data = json.load(f)
+        topic = quiz_data["title"].removesuffix(" Quiz")
+        questions = [
+            {
+                "question": q["question"],
+                "options": q["options"],
+                "correct_answer": q["correctAnswer"],
+                "explanation": q["explanation"],
+            }
+            for q in quiz_data["questions"]
+        ]
+        added += bank.add_questions(topic, "medium", questions)
+    return added
@@ -1,17 +1,35 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 import uvicorn
+import asyncio
 import json
-import requests
-from typing import List, Optional
+import math
+from typing import List, Optional, Sequence
 import os
 import re
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
 
-# New imports for LangChain and Hugging Face
-from langchain.llms import HuggingFacePipeline
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
-from langchain.chat_models import ChatOpenAI  # <-- New import for ChatOpenAI
+from quiz_cache import create_quiz_cache, normalize_key, normalize_topic
+from quiz_stream import QuestionStreamParser
+from question_bank import QuestionBank, seed_question_bank
+from near_duplicates import NearDuplicateIndex
+from quiz_prompts import QuizPromptBuilder, count_tokens, load_encoding
+from quiz_wire import COMPACT_FORMAT, OUTPUT_FORMATS, decode_compact, decode_compact_question
+from llm_backends import LazyBackend
+from static_responses import StaticResponse, etag_matches
+from quiz_jobs import TERMINAL_STATES, JobError, JobQueue, JobWorkers, PrewarmScheduler
+from quiz_admission import BATCH, PREWARM, AdmissionGate, ClientRateLimiter, Overloaded, llm_priority
+from image_cache import NAME_PATTERN, ImageCache, create_image_provider
+from matching_game import build_matching_prompt, load_matching_game, parse_matching_game
+from quiz_metrics import (
+    DEADLINE_MISSES, LLM_ERRORS, gauge, log_event, log_raw_output, record_llm_call, record_stage, render_metrics, set_source, stage,
+    start_trace,
+)
 
 app = FastAPI(title="Quiz Generator API", version="1.0.0")
 
@@ -24,10 +42,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Largest quiz a single request may ask for; bigger quizzes are generated in shards.
+MAX_NUM_QUESTIONS = int(os.getenv("QUIZ_MAX_NUM_QUESTIONS", "100"))
+SHARD_SIZE = int(os.getenv("QUIZ_SHARD_SIZE", "10"))
+# Follow-up LLM calls allowed to replace malformed or missing questions.
+REPAIR_ATTEMPTS = int(os.getenv("QUIZ_REPAIR_ATTEMPTS", "1"))
+# "json" asks the model for the full QuizResponse shape; "compact" asks for
+# positional arrays that are expanded server-side (see quiz_wire.py).
+OUTPUT_FORMAT = os.getenv("QUIZ_OUTPUT_FORMAT", "json")
+if OUTPUT_FORMAT not in OUTPUT_FORMATS:
+    raise ValueError(f"QUIZ_OUTPUT_FORMAT must be one of {OUTPUT_FORMATS}")
+# Longest /api/generate-quiz waits for generation before answering with the
+# fallback quiz (0 waits indefinitely).
+REQUEST_DEADLINE_SECONDS = float(os.getenv("QUIZ_REQUEST_DEADLINE_SECONDS", "15"))
+
 class QuizRequest(BaseModel):
     topic: str
     difficulty: str = "medium"
-    num_questions: int = 5
+    num_questions: int = Field(default=5, ge=1, le=MAX_NUM_QUESTIONS)
 
 class QuizQuestion(BaseModel):
     id: int
@@ -41,20 +73,206 @@ class QuizResponse(BaseModel):
     description: str
     questions: List[QuizQuestion]
 
-# Initialize Hugging Face LLM via LangChain
-def initialize_huggingface_llm():
-    # Use a higher-accuracy model tailored for your RTX 3050 Ti (e.g. EleutherAI/gpt-neo-2.7B)
-    model_name = "EleutherAI/gpt-neo-2.7B"
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForCausalLM.from_pretrained(model_name)
-    hf_pipeline = pipeline("text-generation", model=model, tokenizer=tokenizer, max_length=1024)
-    return HuggingFacePipeline(pipeline=hf_pipeline)
+# The LLM backend (openai, huggingface, local or fake) is imported and built lazily,
+# either by the startup warm-up or by the first request that needs it.
+llm_backend = LazyBackend(os.getenv("QUIZ_LLM_BACKEND", "openai"))
+
+# Bound the number of LLM calls in flight per process; extra calls wait in a
+# bounded priority queue instead of piling up on the provider. An interactive
+# call that would wait longer than QUIZ_MAX_QUEUE_WAIT_SECONDS is shed at once,
+# and each client may start QUIZ_RATE_LIMIT_PER_MINUTE generations a minute.
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("QUIZ_MAX_CONCURRENT_LLM_CALLS", "8"))
+MAX_QUEUED_LLM_CALLS = int(os.getenv("QUIZ_MAX_QUEUED_LLM_CALLS", "64"))
+MAX_QUEUE_WAIT_SECONDS = float(os.getenv("QUIZ_MAX_QUEUE_WAIT_SECONDS", "10"))
+SHED_MODES = ("fallback", "reject")
+SHED_MODE = os.getenv("QUIZ_SHED_MODE", "fallback")
+if SHED_MODE not in SHED_MODES:
+    raise ValueError(f"QUIZ_SHED_MODE must be one of {SHED_MODES}")
+RATE_LIMIT_PER_MINUTE = float(os.getenv("QUIZ_RATE_LIMIT_PER_MINUTE", "0"))
+RATE_LIMIT_BURST = int(os.getenv("QUIZ_RATE_LIMIT_BURST", "10"))
+RATE_LIMIT_KEY_HEADER = os.getenv("QUIZ_RATE_LIMIT_KEY_HEADER")
+
+llm_gate = AdmissionGate(MAX_CONCURRENT_LLM_CALLS, MAX_QUEUED_LLM_CALLS, MAX_QUEUE_WAIT_SECONDS)
+rate_limiter = ClientRateLimiter(RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST)
+
+def check_rate_limit(request: Request) -> None:
+    """Reject the request with 429 if its client has used up its rate limit."""
+    client = request.headers.get(RATE_LIMIT_KEY_HEADER) if RATE_LIMIT_KEY_HEADER else None
+    if client is None:
+        client = request.client.host if request.client else "unknown"
+    wait = rate_limiter.check(client)
+    if wait:
+        raise HTTPException(
+            status_code=429, detail="Rate limit exceeded, try again later", headers={"Retry-After": str(max(1, math.ceil(wait)))}
+        )
+
+# A single LLM call is abandoned after QUIZ_LLM_TIMEOUT_SECONDS, and a stream
+# also when no chunk arrives for QUIZ_LLM_STREAM_IDLE_SECONDS. After
+# QUIZ_CIRCUIT_FAILURE_THRESHOLD consecutive failures the backend is not called
+# for QUIZ_CIRCUIT_RESET_SECONDS, so requests go straight to the fallbacks.
+LLM_TIMEOUT_SECONDS = float(os.getenv("QUIZ_LLM_TIMEOUT_SECONDS", "60"))
+LLM_STREAM_IDLE_SECONDS = float(os.getenv("QUIZ_LLM_STREAM_IDLE_SECONDS", "20"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("QUIZ_CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("QUIZ_CIRCUIT_RESET_SECONDS", "30"))
+
+class CircuitBreaker:
+    """Stops calling a failing backend until it has had time to recover.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls are rejected with 503 for ``reset_seconds``. Then a single trial call
+    is let through: success closes the circuit, failure opens it again.
+    Rejections from the LLM gate are not counted as failures.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    @asynccontextmanager
+    async def call(self):
+        state = self.state
+        if state == "open" or (state == "half_open" and self._trial_in_flight):
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="LLM backend is unavailable, try again later")
+        trial = state == "half_open"
+        self._trial_in_flight = self._trial_in_flight or trial
+        try:
+            yield
+        except HTTPException:
+            raise
+        except Exception:
+            self.failures += 1
+            if trial or self.failures >= self.failure_threshold:
+                if self._opened_at is None or trial:
+                    self.opened += 1
+                self._opened_at = time.monotonic()
+            raise
+        else:
+            self.failures = 0
+            self._opened_at = None
+        finally:
+            if trial:
+                self._trial_in_flight = False
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures, "opened": self.opened, "rejected": self.rejected}
+
+llm_breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key onto one in-flight task.
+
+    The shared work runs in its own task, so a caller that disconnects does not
+    cancel it for the others; its result or exception is delivered to every
+    caller waiting on the key.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._tasks = {}
 
-def initialize_chatopenai_llm():
-    # Use ChatOpenAI with a specific model (e.g. gpt-3.5-turbo) and parameters
-    return ChatOpenAI(model_name="gpt-4o-mini", temperature=0.2, api_key=os.getenv("OPENAI_API_KEY"))
+    async def do(self, key, fn):
+        return await asyncio.shield(self.start(key, fn))
 
-llm = initialize_chatopenai_llm()
+    def start(self, key, fn) -> asyncio.Task:
+        """Start ``fn`` for ``key`` unless it is already running; do not wait for it."""
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+        return task
+
+    def _finish(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every caller went away
+
+    def running(self, key) -> bool:
+        return key in self._tasks
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+quiz_flights = SingleFlight()
+
+quiz_cache = create_quiz_cache()
+
+gauge("quiz_llm_in_flight", "LLM calls currently running", lambda: llm_gate.in_flight)
+gauge("quiz_llm_queued", "LLM calls waiting for a slot", lambda: llm_gate.waiting)
+gauge("quiz_generations_in_flight", "Distinct quiz generations running", lambda: quiz_flights.in_flight)
+gauge("quiz_llm_circuit_open", "1 while the LLM circuit breaker is open or half-open", lambda: int(llm_breaker.state != "closed"))
+
+async def invoke_llm(messages):
+    """Call the LLM without blocking the event loop.
+
+    Uses the native ``ainvoke`` when the backend has one and otherwise runs the
+    blocking ``invoke`` in the worker thread pool.
+    """
+    llm = await llm_backend.get()
+    queued = time.perf_counter()
+    async with llm_breaker.call(), llm_gate.slot():
+        record_stage("queue_wait", time.perf_counter() - queued)
+        with stage("llm"):
+            if hasattr(llm, "ainvoke"):
+                return await asyncio.wait_for(llm.ainvoke(messages), LLM_TIMEOUT_SECONDS)
+            return await asyncio.wait_for(run_in_threadpool(llm.invoke, messages), LLM_TIMEOUT_SECONDS)
+
+async def stream_llm(messages):
+    """Yield the LLM output text chunk by chunk as it is generated.
+
+    The recorded times to first token and for the whole stream include the
+    time the caller spends between chunks, and so does the LLM_TIMEOUT_SECONDS
+    limit on the whole stream. A stalled provider is given up on after
+    LLM_STREAM_IDLE_SECONDS without a chunk, which releases the LLM slot.
+    """
+    llm = await llm_backend.get()
+    queued = time.perf_counter()
+    async with llm_breaker.call(), llm_gate.slot():
+        started = time.perf_counter()
+        record_stage("queue_wait", started - queued)
+        first_token = True
+        with stage("llm"):
+            if hasattr(llm, "astream"):
+                chunks = llm.astream(messages).__aiter__()
+                deadline = started + LLM_TIMEOUT_SECONDS
+                try:
+                    while True:
+                        timeout = max(0.0, min(LLM_STREAM_IDLE_SECONDS, deadline - time.perf_counter()))
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            break
+                        if first_token:
+                            record_stage("ttft", time.perf_counter() - started)
+                            first_token = False
+                        yield chunk.content
+                finally:
+                    if hasattr(chunks, "aclose"):
+                        await chunks.aclose()
+            elif hasattr(llm, "ainvoke"):
+                result = await asyncio.wait_for(llm.ainvoke(messages), LLM_TIMEOUT_SECONDS)
+                yield result.content
+            else:
+                result = await asyncio.wait_for(run_in_threadpool(llm.invoke, messages), LLM_TIMEOUT_SECONDS)
+                yield result.content
 
 def extract_json(text: str) -> str:
     """Extracts the valid JSON substring from a text containing extra data."""
@@ -62,45 +280,230 @@ def extract_json(text: str) -> str:
     if start == -1:
         raise ValueError("No JSON object found in text.")
     brace_count = 0
+    in_string = False
+    escaped = False
     for i in range(start, len(text)):
-        if text[i] == '{':
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
             brace_count += 1
-        elif text[i] == '}':
+        elif char == '}':
             brace_count -= 1
             if brace_count == 0:
                 return text[start:i+1]
     raise ValueError("Could not extract complete JSON object from text.")
 
-def generate_quiz_with_langchain(topic: str, difficulty: str, num_questions: int) -> QuizResponse:
-    # Use a few-shot template with fallback examples incorporated into the prompt
-    few_shot_examples = """
-Example 1 (Historical Events):
-{
-    "title": "Historical Events Quiz",
-    "description": "A medium difficulty quiz about Historical Events",
-    "questions": [
+def validate_question(obj, question_id: int) -> Optional[QuizQuestion]:
+    """Return the question if it is well formed, otherwise None."""
+    if not isinstance(obj, dict):
+        return None
+    try:
+        question = QuizQuestion(**{**obj, "id": question_id})
+    except (TypeError, ValueError):
+        return None
+    if len(question.options) != 4 or not 0 <= question.correct_answer < 4:
+        return None
+    return question
+
+def quiz_metadata(obj: dict, topic: str, difficulty: str) -> dict:
+    """Take title and description from parsed output, with sensible defaults."""
+    metadata = {"title": f"{topic} Quiz", "description": f"A {difficulty} difficulty quiz about {topic}"}
+    for field in metadata:
+        if isinstance(obj.get(field), str):
+            metadata[field] = obj[field]
+    return metadata
+
+def question_parser() -> QuestionStreamParser:
+    return QuestionStreamParser(item="[" if OUTPUT_FORMAT == COMPACT_FORMAT else "{")
+
+def expand_question(item, question_id: int):
+    """Turn a streamed compact question into the regular dict shape."""
+    if OUTPUT_FORMAT == COMPACT_FORMAT:
+        return decode_compact_question(item, question_id) or item
+    return item
+
+def load_quiz_json(text: str):
+    obj = json.loads(extract_json(text))
+    if OUTPUT_FORMAT == COMPACT_FORMAT and isinstance(obj, dict):
+        obj = decode_compact(obj)
+    return obj
+
+def parse_quiz_output(text: str, topic: str, difficulty: str):
+    """Split LLM output into quiz metadata, valid questions and an invalid count.
+
+    Malformed questions are dropped rather than failing the whole quiz. If the
+    output is truncated, every question object that did close is still kept.
+    """
+    with stage("extraction"):
+        try:
+            obj = load_quiz_json(text)
+            raw_questions = obj.get("questions") if isinstance(obj, dict) else None
+            if not isinstance(raw_questions, list):
+                raise ValueError("Invalid quiz format in response")
+        except ValueError:
+            obj = {}
+            raw_questions = [expand_question(item, i + 1) for i, item in enumerate(question_parser().feed(text))]
+    questions = []
+    with stage("validation"):
+        for raw_question in raw_questions:
+            question = validate_question(raw_question, len(questions) + 1)
+            if question is not None:
+                questions.append(question)
+    return quiz_metadata(obj, topic, difficulty), questions, len(raw_questions) - len(questions)
+
+async def generate_quiz_with_langchain(topic: str, difficulty: str, num_questions: int, focus: Optional[str] = None, avoid: Sequence[str] = ()) -> QuizResponse:
+    with stage("prompt_build"):
+        prompt = prompt_builder.build(topic, difficulty, num_questions, focus, avoid)
+    try:
+        result = await invoke_llm(prompt.messages)
+        raw_output = result.content
+        record_llm_call(prompt.input_tokens, count_tokens(raw_output))
+        log_raw_output(raw_output, prompt.input_tokens)
+        metadata, questions, invalid = parse_quiz_output(raw_output, topic, difficulty)
+        if not questions:
+            raise ValueError("No valid questions in LLM output")
+        # Keep the good questions and only ask the model for the ones we lost.
+        for _ in range(REPAIR_ATTEMPTS):
+            missing = num_questions - len(questions)
+            if missing <= 0:
+                break
+            log_event("repair", invalid=invalid, missing=missing)
+            with stage("prompt_build"):
+                repair_prompt = prompt_builder.build_repair(topic, difficulty, missing, [*avoid, *(q.question for q in questions)])
+            result = await invoke_llm(repair_prompt.messages)
+            record_llm_call(repair_prompt.input_tokens, count_tokens(result.content))
+            log_raw_output(result.content, repair_prompt.input_tokens)
+            _, extra, invalid = parse_quiz_output(result.content, topic, difficulty)
+            questions += [question.model_copy(update={"id": len(questions) + i + 1}) for i, question in enumerate(extra[:missing])]
+        return QuizResponse(**metadata, questions=questions[:num_questions])
+    except HTTPException:
+        raise
+    except Exception as e:
+        LLM_ERRORS.inc(endpoint="generate")
+        log_event("llm_error", error=str(e))
+        raise HTTPException(status_code=500, detail=f"LLM generation error: {str(e)}")
+
+# Each shard of a large quiz is steered towards a different angle on the topic
+# so the shards do not all produce the same handful of questions.
+SHARD_FOCUSES = [
+    "key people and their roles",
+    "important dates and events",
+    "places and geography",
+    "core concepts and terminology",
+    "causes, effects and consequences",
+    "records, firsts and notable facts",
+    "lesser-known details",
+    "comparisons and relationships",
+    "origins and history",
+    "modern relevance and legacy",
+]
+
+def merge_quiz_shards(shards: List[QuizResponse], num_questions: int) -> List[QuizQuestion]:
+    """Concatenate shard questions, dropping near-duplicates and renumbering ids."""
+    candidates = [question for shard in shards for question in shard.questions]
+    keep = NearDuplicateIndex().add_questions([question.model_dump() for question in candidates])
+    questions = []
+    for question, new in zip(candidates, keep):
+        if new:
+            questions.append(question.model_copy(update={"id": len(questions) + 1}))
+            if len(questions) == num_questions:
+                break
+    return questions
+
+async def generate_quiz_sharded(topic: str, difficulty: str, num_questions: int, avoid: Sequence[str] = ()) -> QuizResponse:
+    """Generate large quizzes as concurrent shards of at most SHARD_SIZE questions.
+
+    Failed shards are retried once on their own, and a final shard tops the quiz
+    up if de-duplication left it short. Every prompt asks the model not to
+    repeat the questions in ``avoid``.
+    """
+    if num_questions <= SHARD_SIZE:
+        return await generate_quiz_with_langchain(topic, difficulty, num_questions, avoid=avoid)
+
+    sizes = [SHARD_SIZE] * (num_questions // SHARD_SIZE)
+    if num_questions % SHARD_SIZE:
+        sizes.append(num_questions % SHARD_SIZE)
+    focuses = [SHARD_FOCUSES[i % len(SHARD_FOCUSES)] for i in range(len(sizes))]
+
+    async def run_shard(size, focus):
+        try:
+            return await generate_quiz_with_langchain(topic, difficulty, size, focus, avoid)
+        except Overloaded:
+            raise
+        except HTTPException:
+            return await generate_quiz_with_langchain(topic, difficulty, size, focus, avoid)
+
+    results = await asyncio.gather(*[run_shard(size, focus) for size, focus in zip(sizes, focuses)], return_exceptions=True)
+    shards = [result for result in results if isinstance(result, QuizResponse)]
+    if not shards:
+        # Shed shards keep their 503 so the caller can reject or fall back as configured.
+        for result in results:
+            if isinstance(result, Overloaded):
+                raise result
+        raise HTTPException(status_code=500, detail="LLM generation error: every quiz shard failed")
+
+    questions = merge_quiz_shards(shards, num_questions)
+    missing = num_questions - len(questions)
+    if missing:
+        try:
+            extra = await generate_quiz_with_langchain(
+                topic, difficulty, min(missing, SHARD_SIZE), SHARD_FOCUSES[len(sizes) % len(SHARD_FOCUSES)],
+                [*avoid, *(question.question for question in questions)],
+            )
+            questions = merge_quiz_shards([QuizResponse(title="", description="", questions=questions), extra], num_questions)
+        except HTTPException:
+            pass
+
+    return QuizResponse(title=shards[0].title, description=shards[0].description, questions=questions)
+
+# Hand-written quizzes served when the LLM is unavailable.
+FALLBACK_QUIZZES = {
+    "Historical Events": [
         {
             "id": 1,
             "question": "When did World War II end?",
             "options": ["1943", "1944", "1945", "1946"],
             "correct_answer": 2,
-            "explanation": "World War II ended in 1945 with the surrender of Germany and Japan."
+            "explanation": "World War II ended in 1945 with the surrender of Germany in May and Japan in September."
         },
         {
             "id": 2,
             "question": "Who was the first President of the United States?",
             "options": ["Thomas Jefferson", "John Adams", "George Washington", "Benjamin Franklin"],
             "correct_answer": 2,
-            "explanation": "George Washington served as the first President from 1789 to 1797."
+            "explanation": "George Washington was the first President of the United States, serving from 1789 to 1797."
+        },
+        {
+            "id": 3,
+            "question": "In what year did the Berlin Wall fall?",
+            "options": ["1987", "1988", "1989", "1990"],
+            "correct_answer": 2,
+            "explanation": "The Berlin Wall fell on November 9, 1989, marking the end of the Cold War."
+        },
+        {
+            "id": 4,
+            "question": "Who was the first Emperor of Rome?",
+            "options": ["Julius Caesar", "Augustus", "Nero", "Caligula"],
+            "correct_answer": 1,
+            "explanation": "Augustus was the first Emperor of Rome, ruling from 27 BC to 14 AD."
+        },
+        {
+            "id": 5,
+            "question": "When did the American Civil War begin?",
+            "options": ["1860", "1861", "1862", "1863"],
+            "correct_answer": 1,
+            "explanation": "The American Civil War began in 1861 with the attack on Fort Sumter."
         }
-    ]
-}
-
-Example 2 (Science and Technology):
-{
-    "title": "Science and Technology Quiz",
-    "description": "A medium difficulty quiz about Science and Technology",
-    "questions": [
+    ],
+    "Science and Technology": [
         {
             "id": 1,
             "question": "What is the chemical symbol for gold?",
@@ -113,326 +516,232 @@ Example 2 (Science and Technology):
             "question": "Which planet is known as the Red Planet?",
             "options": ["Venus", "Mars", "Jupiter", "Saturn"],
             "correct_answer": 1,
-            "explanation": "Mars is known as the Red Planet due to its reddish appearance."
+            "explanation": "Mars is known as the Red Planet due to its reddish appearance from iron oxide on its surface."
+        },
+        {
+            "id": 3,
+            "question": "What is the largest organ in the human body?",
+            "options": ["Heart", "Brain", "Liver", "Skin"],
+            "correct_answer": 3,
+            "explanation": "The skin is the largest organ in the human body, covering about 20 square feet."
+        },
+        {
+            "id": 4,
+            "question": "Who invented the World Wide Web?",
+            "options": ["Bill Gates", "Tim Berners-Lee", "Steve Jobs", "Mark Zuckerberg"],
+            "correct_answer": 1,
+            "explanation": "Tim Berners-Lee invented the World Wide Web in 1989 while working at CERN."
+        },
+        {
+            "id": 5,
+            "question": "What is the hardest natural substance on Earth?",
+            "options": ["Steel", "Diamond", "Granite", "Quartz"],
+            "correct_answer": 1,
+            "explanation": "Diamond is the hardest natural substance on Earth, scoring 10 on the Mohs scale."
         }
-    ]
-}
-"""
-    prompt = f"""
-You are provided with the following few-shot examples for quiz generation:
-{few_shot_examples}
-
-Now, generate a {difficulty} difficulty quiz about {topic} with {num_questions} multiple choice questions.
-Replace all placeholder texts with real content.
-Do NOT include any text before or after the JSON.
-Return ONLY the JSON object with this exact structure:
-{{
-    "title": "Quiz Title",
-    "description": "Quiz description",
-    "questions": [
-        {{
+    ],
+    "World Geography": [
+        {
+            "id": 1,
+            "question": "What is the capital of Australia?",
+            "options": ["Sydney", "Melbourne", "Canberra", "Brisbane"],
+            "correct_answer": 2,
+            "explanation": "Canberra is the capital of Australia, chosen as a compromise between Sydney and Melbourne."
+        },
+        {
+            "id": 2,
+            "question": "Which is the largest continent by area?",
+            "options": ["North America", "Africa", "Asia", "Europe"],
+            "correct_answer": 2,
+            "explanation": "Asia is the largest continent, covering about 30% of Earth's land area."
+        },
+        {
+            "id": 3,
+            "question": "What is the longest river in the world?",
+            "options": ["Amazon", "Nile", "Yangtze", "Mississippi"],
+            "correct_answer": 1,
+            "explanation": "The Nile is the longest river in the world, stretching about 4,135 miles."
+        },
+        {
+            "id": 4,
+            "question": "Which country has the most islands?",
+            "options": ["Indonesia", "Sweden", "Finland", "Norway"],
+            "correct_answer": 1,
+            "explanation": "Sweden has the most islands in the world, with over 267,570 islands."
+        },
+        {
+            "id": 5,
+            "question": "What is the smallest country in the world?",
+            "options": ["Monaco", "San Marino", "Vatican City", "Liechtenstein"],
+            "correct_answer": 2,
+            "explanation": "Vatican City is the smallest country in the world, covering just 0.17 square miles."
+        }
+    ],
+    "Literature and Authors": [
+        {
             "id": 1,
-            "question": "Replace this with an actual question about {topic}.",
-            "options": ["Real Option 1", "Real Option 2", "Real Option 3", "Real Option 4"],
+            "question": "Who wrote 'Pride and Prejudice'?",
+            "options": ["Charlotte Brontë", "Jane Austen", "Emily Brontë", "Mary Shelley"],
+            "correct_answer": 1,
+            "explanation": "Jane Austen wrote 'Pride and Prejudice', published in 1813."
+        },
+        {
+            "id": 2,
+            "question": "What is the pen name of Samuel Clemens?",
+            "options": ["Mark Twain", "O. Henry", "Lewis Carroll", "George Eliot"],
             "correct_answer": 0,
-            "explanation": "Replace this with an explanation."
-        }}
+            "explanation": "Samuel Clemens wrote under the pen name Mark Twain."
+        },
+        {
+            "id": 3,
+            "question": "Who wrote '1984'?",
+            "options": ["Aldous Huxley", "George Orwell", "Ray Bradbury", "H.G. Wells"],
+            "correct_answer": 1,
+            "explanation": "George Orwell wrote '1984', published in 1949."
+        },
+        {
+            "id": 4,
+            "question": "What is the longest novel ever written?",
+            "options": ["War and Peace", "In Search of Lost Time", "Don Quixote", "Les Misérables"],
+            "correct_answer": 1,
+            "explanation": "'In Search of Lost Time' by Marcel Proust is considered the longest novel at about 1.2 million words."
+        },
+        {
+            "id": 5,
+            "question": "Who wrote 'The Great Gatsby'?",
+            "options": ["Ernest Hemingway", "F. Scott Fitzgerald", "John Steinbeck", "William Faulkner"],
+            "correct_answer": 1,
+            "explanation": "F. Scott Fitzgerald wrote 'The Great Gatsby', published in 1925."
+        }
+    ],
+    "Art and Artists": [
+        {
+            "id": 1,
+            "question": "Who painted the Mona Lisa?",
+            "options": ["Michelangelo", "Leonardo da Vinci", "Raphael", "Donatello"],
+            "correct_answer": 1,
+            "explanation": "Leonardo da Vinci painted the Mona Lisa between 1503 and 1519."
+        },
+        {
+            "id": 2,
+            "question": "What art movement was Pablo Picasso associated with?",
+            "options": ["Impressionism", "Cubism", "Surrealism", "Expressionism"],
+            "correct_answer": 1,
+            "explanation": "Pablo Picasso was a co-founder of Cubism along with Georges Braque."
+        },
+        {
+            "id": 3,
+            "question": "Who painted 'The Starry Night'?",
+            "options": ["Vincent van Gogh", "Claude Monet", "Paul Cézanne", "Henri Matisse"],
+            "correct_answer": 0,
+            "explanation": "Vincent van Gogh painted 'The Starry Night' in 1889."
+        },
+        {
+            "id": 4,
+            "question": "What is the most expensive painting ever sold?",
+            "options": ["The Scream", "Salvator Mundi", "Interchange", "Nafea Faa Ipoipo"],
+            "correct_answer": 1,
+            "explanation": "Salvator Mundi by Leonardo da Vinci sold for $450.3 million in 2017."
+        },
+        {
+            "id": 5,
+            "question": "Who sculpted 'David'?",
+            "options": ["Donatello", "Michelangelo", "Bernini", "Cellini"],
+            "correct_answer": 1,
+            "explanation": "Michelangelo sculpted 'David' between 1501 and 1504."
+        }
+    ],
+    "Mathematics": [
+        {
+            "id": 1,
+            "question": "What is the value of π (pi) to two decimal places?",
+            "options": ["3.12", "3.14", "3.16", "3.18"],
+            "correct_answer": 1,
+            "explanation": "π (pi) is approximately 3.14159, so to two decimal places it's 3.14."
+        },
+        {
+            "id": 2,
+            "question": "What is the square root of 144?",
+            "options": ["10", "11", "12", "13"],
+            "correct_answer": 2,
+            "explanation": "12 × 12 = 144, so the square root of 144 is 12."
+        },
+        {
+            "id": 3,
+            "question": "How many degrees are in a triangle?",
+            "options": ["90", "180", "270", "360"],
+            "correct_answer": 1,
+            "explanation": "The sum of all angles in a triangle is always 180 degrees."
+        },
+        {
+            "id": 4,
+            "question": "What is 2 to the power of 8?",
+            "options": ["128", "256", "512", "1024"],
+            "correct_answer": 1,
+            "explanation": "2^8 = 2 × 2 × 2 × 2 × 2 × 2 × 2 × 2 = 256."
+        },
+        {
+            "id": 5,
+            "question": "What is the next number in the sequence: 2, 4, 8, 16, __?",
+            "options": ["20", "24", "32", "64"],
+            "correct_answer": 2,
+            "explanation": "Each number is multiplied by 2, so 16 × 2 = 32."
+        }
+    ],
+    "Space and Astronomy": [
+        {
+            "id": 1,
+            "question": "What is the closest planet to the Sun?",
+            "options": ["Venus", "Mercury", "Earth", "Mars"],
+            "correct_answer": 1,
+            "explanation": "Mercury is the closest planet to the Sun in our solar system."
+        },
+        {
+            "id": 2,
+            "question": "How many moons does Earth have?",
+            "options": ["0", "1", "2", "3"],
+            "correct_answer": 1,
+            "explanation": "Earth has one natural satellite - the Moon."
+        },
+        {
+            "id": 3,
+            "question": "What is the largest planet in our solar system?",
+            "options": ["Saturn", "Jupiter", "Neptune", "Uranus"],
+            "correct_answer": 1,
+            "explanation": "Jupiter is the largest planet in our solar system."
+        },
+        {
+            "id": 4,
+            "question": "What galaxy do we live in?",
+            "options": ["Andromeda", "Milky Way", "Triangulum", "Large Magellanic Cloud"],
+            "correct_answer": 1,
+            "explanation": "We live in the Milky Way galaxy."
+        },
+        {
+            "id": 5,
+            "question": "What is a light year?",
+            "options": ["Time", "Distance", "Speed", "Energy"],
+            "correct_answer": 1,
+            "explanation": "A light year is a unit of distance - the distance light travels in one year."
+        }
     ]
-}}
-
-Requirements:
-- Each question must have exactly 4 options.
-- correct_answer must be the index (0-3) of the correct option.
-- Questions should be engaging and educational.
-- Explanations must be clear and informative.
-- Ensure the JSON is valid.
-"""
-    try:
-        # ChatOpenAI expects a list of messages; send the prompt as a user message.
-        result = llm.invoke([{"role": "user", "content": prompt}])
-        raw_output = result.content
-        print("Raw LLM output:", raw_output)  # Log the raw response
-        if isinstance(raw_output, str):
-            json_str = extract_json(raw_output)
-            result_obj = json.loads(json_str)
-        if "questions" in result_obj and "title" in result_obj:
-            return QuizResponse(**result_obj)
-        else:
-            raise ValueError("Invalid quiz format in response")
-    except Exception as e:
-        print("LLM generation error:", e)
-        raise HTTPException(status_code=500, detail=f"LLM generation error: {str(e)}")
+}
+
+# Few-shot examples are drawn from the fallback quizzes; the most relevant ones
+# for each topic are included up to QUIZ_FEW_SHOT_TOKEN_BUDGET tokens.
+prompt_builder = QuizPromptBuilder.from_quizzes(
+    FALLBACK_QUIZZES,
+    few_shot_token_budget=int(os.getenv("QUIZ_FEW_SHOT_TOKEN_BUDGET", "400")),
+    output_format=OUTPUT_FORMAT,
+)
 
 # (Optional) Keep your fallback quiz generation function in case of errors
-def generate_fallback_quiz(topic: str, difficulty: str, num_questions: int) -> QuizResponse:
-    fallback_quizzes = {
-        "Historical Events": [
-            {
-                "id": 1,
-                "question": "When did World War II end?",
-                "options": ["1943", "1944", "1945", "1946"],
-                "correct_answer": 2,
-                "explanation": "World War II ended in 1945 with the surrender of Germany in May and Japan in September."
-            },
-            {
-                "id": 2,
-                "question": "Who was the first President of the United States?",
-                "options": ["Thomas Jefferson", "John Adams", "George Washington", "Benjamin Franklin"],
-                "correct_answer": 2,
-                "explanation": "George Washington was the first President of the United States, serving from 1789 to 1797."
-            },
-            {
-                "id": 3,
-                "question": "In what year did the Berlin Wall fall?",
-                "options": ["1987", "1988", "1989", "1990"],
-                "correct_answer": 2,
-                "explanation": "The Berlin Wall fell on November 9, 1989, marking the end of the Cold War."
-            },
-            {
-                "id": 4,
-                "question": "Who was the first Emperor of Rome?",
-                "options": ["Julius Caesar", "Augustus", "Nero", "Caligula"],
-                "correct_answer": 1,
-                "explanation": "Augustus was the first Emperor of Rome, ruling from 27 BC to 14 AD."
-            },
-            {
-                "id": 5,
-                "question": "When did the American Civil War begin?",
-                "options": ["1860", "1861", "1862", "1863"],
-                "correct_answer": 1,
-                "explanation": "The American Civil War began in 1861 with the attack on Fort Sumter."
-            }
-        ],
-        "Science and Technology": [
-            {
-                "id": 1,
-                "question": "What is the chemical symbol for gold?",
-                "options": ["Ag", "Au", "Fe", "Cu"],
-                "correct_answer": 1,
-                "explanation": "Au is the chemical symbol for gold."
-            },
-            {
-                "id": 2,
-                "question": "Which planet is known as the Red Planet?",
-                "options": ["Venus", "Mars", "Jupiter", "Saturn"],
-                "correct_answer": 1,
-                "explanation": "Mars is known as the Red Planet due to its reddish appearance from iron oxide on its surface."
-            },
-            {
-                "id": 3,
-                "question": "What is the largest organ in the human body?",
-                "options": ["Heart", "Brain", "Liver", "Skin"],
-                "correct_answer": 3,
-                "explanation": "The skin is the largest organ in the human body, covering about 20 square feet."
-            },
-            {
-                "id": 4,
-                "question": "Who invented the World Wide Web?",
-                "options": ["Bill Gates", "Tim Berners-Lee", "Steve Jobs", "Mark Zuckerberg"],
-                "correct_answer": 1,
-                "explanation": "Tim Berners-Lee invented the World Wide Web in 1989 while working at CERN."
-            },
-            {
-                "id": 5,
-                "question": "What is the hardest natural substance on Earth?",
-                "options": ["Steel", "Diamond", "Granite", "Quartz"],
-                "correct_answer": 1,
-                "explanation": "Diamond is the hardest natural substance on Earth, scoring 10 on the Mohs scale."
-            }
-        ],
-        "World Geography": [
-            {
-                "id": 1,
-                "question": "What is the capital of Australia?",
-                "options": ["Sydney", "Melbourne", "Canberra", "Brisbane"],
-                "correct_answer": 2,
-                "explanation": "Canberra is the capital of Australia, chosen as a compromise between Sydney and Melbourne."
-            },
-            {
-                "id": 2,
-                "question": "Which is the largest continent by area?",
-                "options": ["North America", "Africa", "Asia", "Europe"],
-                "correct_answer": 2,
-                "explanation": "Asia is the largest continent, covering about 30% of Earth's land area."
-            },
-            {
-                "id": 3,
-                "question": "What is the longest river in the world?",
-                "options": ["Amazon", "Nile", "Yangtze", "Mississippi"],
-                "correct_answer": 1,
-                "explanation": "The Nile is the longest river in the world, stretching about 4,135 miles."
-            },
-            {
-                "id": 4,
-                "question": "Which country has the most islands?",
-                "options": ["Indonesia", "Sweden", "Finland", "Norway"],
-                "correct_answer": 1,
-                "explanation": "Sweden has the most islands in the world, with over 267,570 islands."
-            },
-            {
-                "id": 5,
-                "question": "What is the smallest country in the world?",
-                "options": ["Monaco", "San Marino", "Vatican City", "Liechtenstein"],
-                "correct_answer": 2,
-                "explanation": "Vatican City is the smallest country in the world, covering just 0.17 square miles."
-            }
-        ],
-        "Literature and Authors": [
-            {
-                "id": 1,
-                "question": "Who wrote 'Pride and Prejudice'?",
-                "options": ["Charlotte Brontë", "Jane Austen", "Emily Brontë", "Mary Shelley"],
-                "correct_answer": 1,
-                "explanation": "Jane Austen wrote 'Pride and Prejudice', published in 1813."
-            },
-            {
-                "id": 2,
-                "question": "What is the pen name of Samuel Clemens?",
-                "options": ["Mark Twain", "O. Henry", "Lewis Carroll", "George Eliot"],
-                "correct_answer": 0,
-                "explanation": "Samuel Clemens wrote under the pen name Mark Twain."
-            },
-            {
-                "id": 3,
-                "question": "Who wrote '1984'?",
-                "options": ["Aldous Huxley", "George Orwell", "Ray Bradbury", "H.G. Wells"],
-                "correct_answer": 1,
-                "explanation": "George Orwell wrote '1984', published in 1949."
-            },
-            {
-                "id": 4,
-                "question": "What is the longest novel ever written?",
-                "options": ["War and Peace", "In Search of Lost Time", "Don Quixote", "Les Misérables"],
-                "correct_answer": 1,
-                "explanation": "'In Search of Lost Time' by Marcel Proust is considered the longest novel at about 1.2 million words."
-            },
-            {
-                "id": 5,
-                "question": "Who wrote 'The Great Gatsby'?",
-                "options": ["Ernest Hemingway", "F. Scott Fitzgerald", "John Steinbeck", "William Faulkner"],
-                "correct_answer": 1,
-                "explanation": "F. Scott Fitzgerald wrote 'The Great Gatsby', published in 1925."
-            }
-        ],
-        "Art and Artists": [
-            {
-                "id": 1,
-                "question": "Who painted the Mona Lisa?",
-                "options": ["Michelangelo", "Leonardo da Vinci", "Raphael", "Donatello"],
-                "correct_answer": 1,
-                "explanation": "Leonardo da Vinci painted the Mona Lisa between 1503 and 1519."
-            },
-            {
-                "id": 2,
-                "question": "What art movement was Pablo Picasso associated with?",
-                "options": ["Impressionism", "Cubism", "Surrealism", "Expressionism"],
-                "correct_answer": 1,
-                "explanation": "Pablo Picasso was a co-founder of Cubism along with Georges Braque."
-            },
-            {
-                "id": 3,
-                "question": "Who painted 'The Starry Night'?",
-                "options": ["Vincent van Gogh", "Claude Monet", "Paul Cézanne", "Henri Matisse"],
-                "correct_answer": 0,
-                "explanation": "Vincent van Gogh painted 'The Starry Night' in 1889."
-            },
-            {
-                "id": 4,
-                "question": "What is the most expensive painting ever sold?",
-                "options": ["The Scream", "Salvator Mundi", "Interchange", "Nafea Faa Ipoipo"],
-                "correct_answer": 1,
-                "explanation": "Salvator Mundi by Leonardo da Vinci sold for $450.3 million in 2017."
-            },
-            {
-                "id": 5,
-                "question": "Who sculpted 'David'?",
-                "options": ["Donatello", "Michelangelo", "Bernini", "Cellini"],
-                "correct_answer": 1,
-                "explanation": "Michelangelo sculpted 'David' between 1501 and 1504."
-            }
-        ],
-        "Mathematics": [
-            {
-                "id": 1,
-                "question": "What is the value of π (pi) to two decimal places?",
-                "options": ["3.12", "3.14", "3.16", "3.18"],
-                "correct_answer": 1,
-                "explanation": "π (pi) is approximately 3.14159, so to two decimal places it's 3.14."
-            },
-            {
-                "id": 2,
-                "question": "What is the square root of 144?",
-                "options": ["10", "11", "12", "13"],
-                "correct_answer": 2,
-                "explanation": "12 × 12 = 144, so the square root of 144 is 12."
-            },
-            {
-                "id": 3,
-                "question": "How many degrees are in a triangle?",
-                "options": ["90", "180", "270", "360"],
-                "correct_answer": 1,
-                "explanation": "The sum of all angles in a triangle is always 180 degrees."
-            },
-            {
-                "id": 4,
-                "question": "What is 2 to the power of 8?",
-                "options": ["128", "256", "512", "1024"],
-                "correct_answer": 1,
-                "explanation": "2^8 = 2 × 2 × 2 × 2 × 2 × 2 × 2 × 2 = 256."
-            },
-            {
-                "id": 5,
-                "question": "What is the next number in the sequence: 2, 4, 8, 16, __?",
-                "options": ["20", "24", "32", "64"],
-                "correct_answer": 2,
-                "explanation": "Each number is multiplied by 2, so 16 × 2 = 32."
-            }
-        ],
-        "Space and Astronomy": [
-            {
-                "id": 1,
-                "question": "What is the closest planet to the Sun?",
-                "options": ["Venus", "Mercury", "Earth", "Mars"],
-                "correct_answer": 1,
-                "explanation": "Mercury is the closest planet to the Sun in our solar system."
-            },
-            {
-                "id": 2,
-                "question": "How many moons does Earth have?",
-                "options": ["0", "1", "2", "3"],
-                "correct_answer": 1,
-                "explanation": "Earth has one natural satellite - the Moon."
-            },
-            {
-                "id": 3,
-                "question": "What is the largest planet in our solar system?",
-                "options": ["Saturn", "Jupiter", "Neptune", "Uranus"],
-                "correct_answer": 1,
-                "explanation": "Jupiter is the largest planet in our solar system."
-            },
-            {
-                "id": 4,
-                "question": "What galaxy do we live in?",
-                "options": ["Andromeda", "Milky Way", "Triangulum", "Large Magellanic Cloud"],
-                "correct_answer": 1,
-                "explanation": "We live in the Milky Way galaxy."
-            },
-            {
-                "id": 5,
-                "question": "What is a light year?",
-                "options": ["Time", "Distance", "Speed", "Energy"],
-                "correct_answer": 1,
-                "explanation": "A light year is a unit of distance - the distance light travels in one year."
-            }
-        ]
-    }
-    
-    if topic in fallback_quizzes:
-        questions = fallback_quizzes[topic][:num_questions]
-        title = f"{topic} Quiz"
-        description = f"A {difficulty} difficulty quiz about {topic}"
+def generate_fallback_quiz(topic: str, difficulty: str, num_questions: int) -> dict:
+    if topic in FALLBACK_QUIZZES:
+        questions = FALLBACK_QUIZZES[topic][:num_questions]
     else:
-        # Dynamically create a fallback quiz with generic questions related to the topic
+        # Dynamically create a fallback quiz with a generic question related to the topic.
+        # It is served once rather than repeated num_questions times.
         questions = [
             {
                 "id": 1,
@@ -441,16 +750,202 @@ def generate_fallback_quiz(topic: str, difficulty: str, num_questions: int) -> Q
                 "correct_answer": 0,
                 "explanation": f"Option A is a notable fact about {topic}."
             }
-        ] * num_questions  # Repeat the generic question for demonstration
-        title = f"{topic} Quiz"
-        description = f"A {difficulty} difficulty quiz about {topic}"
+        ]
 
-    quiz_data = {
-        "title": title,
-        "description": description,
+    return {
+        "title": f"{topic} Quiz",
+        "description": f"A {difficulty} difficulty quiz about {topic}",
         "questions": questions
     }
-    return QuizResponse(**quiz_data)
+
+@lru_cache(maxsize=1024)
+def _fallback_response(topic: str, difficulty: str, num_questions: int) -> StaticResponse:
+    quiz = QuizResponse(**generate_fallback_quiz(topic, difficulty, num_questions))
+    return StaticResponse(quiz.model_dump())
+
+def fallback_response(topic: str, difficulty: str, num_questions: int) -> StaticResponse:
+    """The fallback quiz, validated and serialized once per distinct response."""
+    available = len(FALLBACK_QUIZZES[topic]) if topic in FALLBACK_QUIZZES else 1
+    return _fallback_response(topic, difficulty, min(num_questions, available))
+
+TOPICS = [
+    "Historical Events",
+    "World Geography",
+    "Science and Technology",
+    "Literature and Authors",
+    "Art and Artists",
+    "Mathematics",
+    "Space and Astronomy",
+    "Ancient Civilizations",
+    "Modern Politics",
+    "Environmental Science",
+    "Music History",
+    "Sports Legends",
+    "Famous Inventors",
+    "World Religions",
+    "Oceanography"
+]
+DIFFICULTIES = ["easy", "medium", "hard"]
+
+# The static endpoints and every fallback quiz for the hand-written topics are
+# encoded up front, so serving them while the LLM is down costs no validation
+# or JSON encoding.
+TOPICS_RESPONSE = StaticResponse({"topics": TOPICS}, cache_control="public, max-age=3600")
+DIFFICULTIES_RESPONSE = StaticResponse({"difficulties": DIFFICULTIES}, cache_control="public, max-age=3600")
+for _topic, _questions in FALLBACK_QUIZZES.items():
+    for _difficulty in DIFFICULTIES:
+        for _count in range(1, len(_questions) + 1):
+            fallback_response(_topic, _difficulty, _count)
+
+# Validated questions are kept in a local bank so repeat topics can be served
+# without the LLM. Set QUIZ_BANK_ENABLED=0 to always generate fresh quizzes.
+if os.getenv("QUIZ_BANK_ENABLED", "1") == "1":
+    question_bank = QuestionBank(os.getenv("QUIZ_BANK_PATH", "question-bank.sqlite3"))
+    seed_question_bank(question_bank, FALLBACK_QUIZZES)
+else:
+    question_bank = None
+
+async def store_questions(topic: str, difficulty: str, questions: List[QuizQuestion]) -> None:
+    if question_bank is not None:
+        await question_bank.aadd_questions(topic, difficulty, [question.model_dump() for question in questions])
+
+async def sample_bank(topic: str, difficulty: str, num_questions: int) -> List[dict]:
+    if question_bank is None:
+        return []
+    return await question_bank.asample(topic, difficulty, num_questions)
+
+async def assemble_quiz(topic: str, difficulty: str, num_questions: int) -> QuizResponse:
+    """Build a quiz from the question bank, generating only what it lacks."""
+    banked = await sample_bank(topic, difficulty, num_questions)
+    quiz = QuizResponse(title=f"{topic} Quiz", description=f"A {difficulty} difficulty quiz about {topic}", questions=banked)
+    if len(banked) >= num_questions:
+        set_source("bank")
+        return quiz
+    # Generated questions that near-duplicate banked ones are merged away, so
+    # the quiz is topped up again if that leaves it short.
+    for attempt in range(1 + REPAIR_ATTEMPTS):
+        missing = num_questions - len(quiz.questions)
+        if missing <= 0:
+            break
+        try:
+            generated = await generate_quiz_sharded(topic, difficulty, missing, [question.question for question in quiz.questions])
+        except HTTPException:
+            if not attempt:
+                raise
+            break
+        set_source("llm")
+        await store_questions(topic, difficulty, generated.questions)
+        if not attempt and not banked:
+            quiz = generated
+            continue
+        questions = merge_quiz_shards([quiz, generated], num_questions)
+        quiz = QuizResponse(title=generated.title, description=generated.description, questions=questions)
+    return quiz
+
+async def refresh_cached_quiz(topic: str, difficulty: str, num_questions: int) -> QuizResponse:
+    quiz = await assemble_quiz(topic=topic, difficulty=difficulty, num_questions=num_questions)
+    await quiz_cache.aput(topic, difficulty, quiz.model_dump())
+    return quiz
+
+# Quiz jobs are queued in SQLite and run by QUIZ_JOB_WORKERS background tasks,
+# so clients can submit a quiz and collect it later. With a token budget set,
+# idle capacity is spent pre-generating the topic x difficulty grid into the
+# cache; the budget is counted over a rolling window.
+JOB_WORKERS = int(os.getenv("QUIZ_JOB_WORKERS", "2"))
+JOB_POLL_MAX_SECONDS = 30.0
+PREWARM_TOKEN_BUDGET = int(os.getenv("QUIZ_PREWARM_TOKEN_BUDGET", "0"))
+PREWARM_NUM_QUESTIONS = int(os.getenv("QUIZ_PREWARM_NUM_QUESTIONS", "10"))
+
+async def run_quiz_job(job: dict):
+    """Generate a job's quiz through the cache; returns (quiz, tokens spent)."""
+    topic, difficulty, num_questions = job["topic"], job["difficulty"], job["num_questions"]
+    with start_trace("job") as trace:
+        quiz = await quiz_cache.aget(topic, difficulty, num_questions)
+        if quiz is not None:
+            trace.source = "cache"
+            return quiz, 0
+        key = (*normalize_key(topic, difficulty), num_questions)
+        if not quiz_flights.running(key):
+            # Job generations queue for LLM slots behind interactive requests.
+            # The flight task inherits that priority, so it gets a key of its
+            # own that interactive requests never join; a job does join a
+            # running interactive generation.
+            key = (*key, job["kind"])
+        priority = llm_priority.set(PREWARM if job["kind"] == "prewarm" else BATCH)
+        try:
+            quiz = await quiz_flights.do(key, lambda: refresh_cached_quiz(topic, difficulty, num_questions))
+        except Exception as e:
+            # Tokens spent on a failed attempt still count toward the pre-warm budget.
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            raise JobError(error, trace.input_tokens + trace.output_tokens) from e
+        finally:
+            llm_priority.reset(priority)
+        trace.source = trace.source or "coalesced"
+        return quiz.model_dump(), trace.input_tokens + trace.output_tokens
+
+def prewarm_wanted():
+    if quiz_cache.backend == "none":
+        return
+    for topic in TOPICS:
+        for difficulty in DIFFICULTIES:
+            if not quiz_cache.has_fresh(topic, difficulty, PREWARM_NUM_QUESTIONS):
+                yield topic, difficulty
+
+def llm_idle() -> bool:
+    return (
+        llm_backend.ready
+        and llm_breaker.state == "closed"
+        and llm_gate.waiting == 0
+        and llm_gate.in_flight < max(1, MAX_CONCURRENT_LLM_CALLS // 2)
+    )
+
+job_queue = JobQueue(
+    os.getenv("QUIZ_JOBS_PATH", "quiz-jobs.sqlite3"),
+    lease_seconds=float(os.getenv("QUIZ_JOB_LEASE_SECONDS", "600")),
+    retention_seconds=float(os.getenv("QUIZ_JOB_RETENTION_SECONDS", "86400")),
+)
+job_workers = JobWorkers(job_queue, run_quiz_job, workers=JOB_WORKERS)
+prewarm_scheduler = PrewarmScheduler(
+    job_workers,
+    prewarm_wanted,
+    llm_idle,
+    token_budget=PREWARM_TOKEN_BUDGET,
+    budget_window_seconds=float(os.getenv("QUIZ_PREWARM_BUDGET_WINDOW_SECONDS", "86400")),
+    num_questions=PREWARM_NUM_QUESTIONS,
+    interval_seconds=float(os.getenv("QUIZ_PREWARM_INTERVAL_SECONDS", "30")),
+)
+
+gauge("quiz_jobs_running", "Quiz jobs being generated by the job workers", lambda: job_workers.running)
+
+@app.on_event("startup")
+async def warm_up_llm_backend():
+    # Warm up in the background so the server starts accepting requests at once;
+    # /ready reports when the backend is usable.
+    asyncio.create_task(llm_backend.warm_up())
+
+@app.on_event("startup")
+async def warm_up_tokenizer():
+    # tiktoken downloads its encoding on a cold machine; load it off the event
+    # loop so the first prompt does not wait for it.
+    asyncio.get_running_loop().run_in_executor(None, load_encoding)
+
+@app.on_event("startup")
+async def start_job_workers():
+    job_workers.start()
+    prewarm_scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    await prewarm_scheduler.stop()
+    await job_workers.stop()
+
+@app.on_event("shutdown")
+async def close_llm_backend():
+    await llm_backend.close()
+
+@app.on_event("shutdown")
+async def close_image_cache():
+    await image_cache.close()
 
 @app.get("/")
 async def root():
@@ -458,49 +953,346 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "quiz-generator"}
+    return {
+        "status": "healthy",
+        "service": "quiz-generator",
+        "llm_in_flight": llm_gate.in_flight,
+        "llm_queued": llm_gate.waiting,
+        "cache": quiz_cache.stats(),
+        "generations_in_flight": quiz_flights.in_flight,
+        "coalesced_requests": quiz_flights.coalesced,
+        "circuit": llm_breaker.stats(),
+        "admission": llm_gate.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "llm_backend": llm_backend.stats(),
+        "prompts": prompt_builder.stats(),
+        "question_bank": await asyncio.get_running_loop().run_in_executor(None, question_bank.stats) if question_bank is not None else None,
+        "fallback_responses": _fallback_response.cache_info()._asdict(),
+        "jobs": await asyncio.get_running_loop().run_in_executor(None, job_workers.stats),
+        "prewarm": await asyncio.get_running_loop().run_in_executor(None, prewarm_scheduler.stats),
+        "matching_cache": matching_cache.stats(),
+        "images": image_cache.stats(),
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Request, stage and token metrics in the Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def readiness_check():
+    """Report whether the LLM backend has finished warming up"""
+    body = {"ready": llm_backend.ready, "backend": llm_backend.name, "error": llm_backend.error}
+    if not llm_backend.ready:
+        return JSONResponse(body, status_code=503)
+    return body
 
 @app.post("/api/generate-quiz", response_model=QuizResponse)
-async def generate_quiz(request: QuizRequest):
+async def generate_quiz(request: QuizRequest, http_request: Request):
     """Generate a quiz using LangChain and a Hugging Face model"""
+    check_rate_limit(http_request)
+    with start_trace("generate") as trace:
+        return await traced_generate_quiz(request, http_request, trace)
+
+async def traced_generate_quiz(request: QuizRequest, http_request: Request, trace):
+    cached = await quiz_cache.aget(request.topic, request.difficulty, request.num_questions)
+    if cached is not None:
+        trace.source = "cache"
+        return cached
+
+    def generate_and_cache():
+        return refresh_cached_quiz(request.topic, request.difficulty, request.num_questions)
+
+    key = (*normalize_key(request.topic, request.difficulty), request.num_questions)
+    stale = await quiz_cache.aget_stale(request.topic, request.difficulty, request.num_questions)
+    if stale is not None:
+        # Serve the expired quiz at once and refresh it in the background.
+        quiz_flights.start(key, generate_and_cache)
+        trace.source = "stale"
+        return stale
     try:
-        quiz = generate_quiz_with_langchain(
-            topic=request.topic,
-            difficulty=request.difficulty,
-            num_questions=request.num_questions
-        )
+        # Past the deadline the generation keeps running in its own task and
+        # fills the cache for later requests; this one gets the fallback.
+        quiz = await asyncio.wait_for(quiz_flights.do(key, generate_and_cache), REQUEST_DEADLINE_SECONDS or None)
+        # The shared generation records its source on the trace of the request
+        # that started it; the others were served by it.
+        trace.source = trace.source or "coalesced"
         return quiz
     except Exception as e:
         # You can optionally fall back to a predefined quiz
-        return generate_fallback_quiz(request.topic, request.difficulty, request.num_questions)
+        if isinstance(e, asyncio.TimeoutError):
+            DEADLINE_MISSES.inc(endpoint="generate")
+        if isinstance(e, Overloaded) and SHED_MODE == "reject":
+            trace.source = "shed"
+            raise
+        trace.source = "fallback"
+        with stage("fallback"):
+            return fallback_response(request.topic, request.difficulty, request.num_questions).response(http_request)
+
+def ndjson_event(event: dict) -> bytes:
+    return (json.dumps(event) + "\n").encode()
+
+async def stream_quiz_events(request: QuizRequest):
+    with start_trace("stream") as trace:
+        async for event in traced_stream_quiz_events(request, trace):
+            yield event
+
+async def traced_stream_quiz_events(request: QuizRequest, trace):
+    cached = await quiz_cache.aget(request.topic, request.difficulty, request.num_questions)
+    if cached is None:
+        cached = await quiz_cache.aget_stale(request.topic, request.difficulty, request.num_questions)
+        if cached is not None:
+            # Serve the expired quiz and regenerate it the same way /api/generate-quiz does.
+            quiz_flights.start(
+                (*normalize_key(request.topic, request.difficulty), request.num_questions),
+                lambda: refresh_cached_quiz(request.topic, request.difficulty, request.num_questions),
+            )
+            trace.source = "stale"
+    if cached is not None:
+        trace.source = trace.source or "cache"
+        for question in cached["questions"]:
+            yield ndjson_event({"type": "question", "question": question})
+        yield ndjson_event({"type": "done", "title": cached["title"], "description": cached["description"], "source": trace.source})
+        return
+
+    banked = await sample_bank(request.topic, request.difficulty, request.num_questions)
+    if len(banked) >= request.num_questions:
+        trace.source = "bank"
+        for question in banked:
+            yield ndjson_event({"type": "question", "question": question})
+        yield ndjson_event({
+            "type": "done",
+            "title": f"{request.topic} Quiz",
+            "description": f"A {request.difficulty} difficulty quiz about {request.topic}",
+            "source": "bank",
+        })
+        return
+
+    with stage("prompt_build"):
+        prompt = prompt_builder.build(request.topic, request.difficulty, request.num_questions)
+    parser = question_parser()
+    seen = NearDuplicateIndex()
+    questions = []
+    failed = False
+    # Parsing and validation happen chunk by chunk; their totals are recorded once.
+    extraction_time = validation_time = 0.0
+    try:
+        async for chunk in stream_llm(prompt.messages):
+            started = time.perf_counter()
+            items = parser.feed(chunk)
+            validated = time.perf_counter()
+            extraction_time += validated - started
+            for obj in items:
+                if len(questions) >= request.num_questions:
+                    break
+                question = validate_question(expand_question(obj, len(questions) + 1), len(questions) + 1)
+                if question is None or not seen.add_questions([question.model_dump()])[0]:
+                    continue
+                questions.append(question)
+                validation_time += time.perf_counter() - validated
+                yield ndjson_event({"type": "question", "question": question.model_dump()})
+                validated = time.perf_counter()
+            validation_time += time.perf_counter() - validated
+    except Exception as e:
+        LLM_ERRORS.inc(endpoint="stream")
+        log_event("llm_error", error=str(e))
+        failed = True
+    if parser.text:
+        record_stage("extraction", extraction_time)
+        record_stage("validation", validation_time)
+        record_llm_call(prompt.input_tokens, count_tokens(parser.text))
+        log_raw_output(parser.text, prompt.input_tokens)
+
+    if not questions:
+        trace.source = "fallback"
+        with stage("fallback"):
+            quiz = fallback_response(request.topic, request.difficulty, request.num_questions).content
+        for question in quiz["questions"]:
+            yield ndjson_event({"type": "question", "question": question})
+        yield ndjson_event({"type": "done", "title": quiz["title"], "description": quiz["description"], "source": "fallback"})
+        return
+
+    try:
+        parsed = load_quiz_json(parser.text)
+    except ValueError:
+        parsed = {}
+    metadata = quiz_metadata(parsed, request.topic, request.difficulty)
+    trace.source = "llm"
+    if not failed:
+        quiz = QuizResponse(**metadata, questions=questions)
+        await store_questions(request.topic, request.difficulty, questions)
+        await quiz_cache.aput(request.topic, request.difficulty, quiz.model_dump())
+    yield ndjson_event({"type": "done", **metadata, "source": "llm", "input_tokens": prompt.input_tokens})
+
+@app.post("/api/generate-quiz/stream")
+async def generate_quiz_stream(request: QuizRequest, http_request: Request):
+    """Stream a quiz as newline-delimited JSON, one question per line as it is generated."""
+    check_rate_limit(http_request)
+    return StreamingResponse(stream_quiz_events(request), media_type="application/x-ndjson")
+
+def job_body(job: dict) -> dict:
+    body = {"job_id": job["id"], "status": job["status"], "topic": job["topic"], "difficulty": job["difficulty"],
+            "num_questions": job["num_questions"]}
+    if job["status"] == "done":
+        body["quiz"] = job["result"]
+    elif job["status"] == "failed":
+        body["error"] = job["error"]
+    return body
+
+@app.post("/api/jobs", status_code=202)
+async def submit_quiz_job(request: QuizRequest, http_request: Request):
+    """Queue a quiz for generation; poll its status URL or watch its websocket"""
+    check_rate_limit(http_request)
+    job = await job_workers.submit(request.topic, request.difficulty, request.num_questions)
+    return {
+        **job_body(job),
+        "status_url": f"/api/jobs/{job['id']}",
+        "websocket_url": f"/api/jobs/{job['id']}/ws",
+    }
+
+@app.get("/api/jobs/{job_id}")
+async def get_quiz_job(job_id: str, wait: float = 0.0):
+    """Job status and, once done, the quiz; ``wait`` long-polls for up to that many seconds"""
+    job = await job_queue.aget(job_id)
+    deadline = time.monotonic() + min(max(wait, 0.0), JOB_POLL_MAX_SECONDS)
+    while job is not None and job["status"] not in TERMINAL_STATES and time.monotonic() < deadline:
+        await job_workers.wait_for_update(job_id, min(deadline - time.monotonic(), job_workers.poll_seconds))
+        job = await job_queue.aget(job_id)
+    if job is None:
+        # Unknown, or purged after QUIZ_JOB_RETENTION_SECONDS while waiting.
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job_body(job)
+
+@app.websocket("/api/jobs/{job_id}/ws")
+async def watch_quiz_job(websocket: WebSocket, job_id: str):
+    """Push the job's status on every change until it is done or failed"""
+    await websocket.accept()
+    job = await job_queue.aget(job_id)
+    if job is None:
+        await websocket.close(code=4404, reason="Unknown job")
+        return
+    try:
+        await websocket.send_json(job_body(job))
+        while job["status"] not in TERMINAL_STATES:
+            status = job["status"]
+            await job_workers.wait_for_update(job_id, job_workers.poll_seconds)
+            job = await job_queue.aget(job_id)
+            if job is None:
+                await websocket.close(code=4404, reason="Unknown job")
+                return
+            if job["status"] != status:
+                await websocket.send_json(job_body(job))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+# Matching games are generated like quizzes and cached per topic in a cache of
+# their own (games have no difficulty). Their images are drawn by the
+# QUIZ_IMAGE_PROVIDER in the background as soon as a game is handed out, and
+# stored under QUIZ_IMAGE_CACHE_DIR by prompt hash, so a repeat game makes no
+# LLM or image provider calls at all.
+MAX_MATCHING_PAIRS = 20
+
+matching_cache = create_quiz_cache("QUIZ_MATCHING_CACHE_PATH", "matching-cache.sqlite3", items_key="pairs")
+
+image_cache = ImageCache(
+    os.getenv("QUIZ_IMAGE_CACHE_DIR", "image-cache"),
+    create_image_provider(os.getenv("QUIZ_IMAGE_PROVIDER", "placeholder")),
+    concurrency=int(os.getenv("QUIZ_IMAGE_CONCURRENCY", "4")),
+)
+
+if os.path.exists("historical_events_matching_game.json"):
+    FALLBACK_MATCHING_GAME = load_matching_game(
+        "historical_events_matching_game.json",
+        title="Historical Events Matching Game",
+        description="Match each historical event with its picture",
+    )
+else:
+    FALLBACK_MATCHING_GAME = {"title": "", "description": "", "pairs": []}
+
+class MatchingGameRequest(BaseModel):
+    topic: str
+    num_pairs: int = Field(default=5, ge=1, le=MAX_MATCHING_PAIRS)
+
+async def generate_matching_game(topic: str, num_pairs: int) -> dict:
+    prompt = build_matching_prompt(topic, num_pairs)
+    try:
+        result = await invoke_llm(prompt.messages)
+        record_llm_call(prompt.input_tokens, count_tokens(result.content))
+        log_raw_output(result.content, prompt.input_tokens)
+        with stage("validation"):
+            game = parse_matching_game(extract_json(result.content), topic)
+    except HTTPException:
+        raise
+    except Exception as e:
+        LLM_ERRORS.inc(endpoint="matching")
+        log_event("llm_error", error=str(e))
+        raise HTTPException(status_code=500, detail=f"LLM generation error: {str(e)}")
+    set_source("llm")
+    await matching_cache.aput(topic, "", game)
+    return game
+
+def with_images(game: dict) -> dict:
+    """Start drawing the game's images and point each pair at its image URL."""
+    names = image_cache.prefetch(pair["image_prompt"] for pair in game["pairs"])
+    pairs = [{**pair, "image_url": f"/api/images/{name}"} for pair, name in zip(game["pairs"], names)]
+    return {**game, "pairs": pairs}
+
+@app.post("/api/matching-game")
+async def create_matching_game(request: MatchingGameRequest, http_request: Request):
+    """Generate a matching game; its images are served from /api/images as they are drawn"""
+    check_rate_limit(http_request)
+    with start_trace("matching") as trace:
+        game = await matching_cache.aget(request.topic, "", request.num_pairs)
+        if game is not None:
+            trace.source = "cache"
+            return with_images(game)
+        key = ("matching", normalize_topic(request.topic), request.num_pairs)
+        try:
+            game = await asyncio.wait_for(
+                quiz_flights.do(key, lambda: generate_matching_game(request.topic, request.num_pairs)),
+                REQUEST_DEADLINE_SECONDS or None,
+            )
+            trace.source = trace.source or "coalesced"
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                DEADLINE_MISSES.inc(endpoint="matching")
+            if not FALLBACK_MATCHING_GAME["pairs"]:
+                raise HTTPException(status_code=503, detail="Matching game generation is unavailable")
+            trace.source = "fallback"
+            game = {**FALLBACK_MATCHING_GAME, "pairs": FALLBACK_MATCHING_GAME["pairs"][:request.num_pairs]}
+        return with_images(game)
+
+@app.get("/api/images/{name}")
+async def get_image(name: str, request: Request):
+    """A matching-game image; waits for it if it is still being drawn"""
+    if not NAME_PATTERN.match(name):
+        raise HTTPException(status_code=404, detail="Unknown image")
+    # Images are content-addressed, so the name is a strong ETag and never goes stale.
+    headers = {"ETag": f'"{name.split(".")[0]}"', "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag_matches(request.headers.get("if-none-match", ""), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    path = await image_cache.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Unknown image")
+    return FileResponse(path, media_type=image_cache.media_type(name), headers=headers)
+
+@app.get("/api/questions/search")
+async def search_questions(q: str, topic: Optional[str] = None, limit: int = 20):
+    """Full-text search over the questions stored in the question bank"""
+    if question_bank is None:
+        raise HTTPException(status_code=404, detail="Question bank is disabled")
+    return {"questions": await question_bank.asearch(q, topic, max(1, min(limit, 100)))}
 
 @app.get("/api/topics")
-async def get_topics():
+async def get_topics(request: Request):
     """Get a list of suggested quiz topics"""
-    topics = [
-        "Historical Events",
-        "World Geography", 
-        "Science and Technology",
-        "Literature and Authors",
-        "Art and Artists",
-        "Mathematics",
-        "Space and Astronomy",
-        "Ancient Civilizations",
-        "Modern Politics",
-        "Environmental Science",
-        "Music History",
-        "Sports Legends",
-        "Famous Inventors",
-        "World Religions",
-        "Oceanography"
-    ]
-    return {"topics": topics}
+    return TOPICS_RESPONSE.response(request)
 
 @app.get("/api/difficulties")
-async def get_difficulties():
+async def get_difficulties(request: Request):
     """Get available difficulty levels"""
-    difficulties = ["easy", "medium", "hard"]
-    return {"difficulties": difficulties}
+    return DIFFICULTIES_RESPONSE.response(request)
 
 if __name__ == "__main__":
     print("Starting Quiz Generator API...")
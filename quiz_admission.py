@@ -0,0 +1,202 @@
+"""Admission control for LLM work: per-client rate limits and a priority gate.
+
+``ClientRateLimiter`` gives every client a token bucket, so one client cannot
+take the whole generation capacity. ``AdmissionGate`` caps the LLM calls in
+flight and queues the rest by priority class. Interactive requests are
+admitted before queued jobs, and jobs cannot take the slots reserved for
+interactive requests. When the queue is full, or an interactive caller would
+wait longer than ``max_wait_seconds``, the call is shed with ``Overloaded``
+right away instead of piling up behind the provider.
+
+The priority of the calls made while serving a request is taken from the
+``llm_priority`` context variable, so tasks spawned for shards and coalesced
+generations inherit it.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import HTTPException
+
+from quiz_metrics import SHED_REQUESTS
+
+INTERACTIVE = 0
+BATCH = 1
+PREWARM = 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", PREWARM: "prewarm"}
+
+llm_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+class Overloaded(HTTPException):
+    """503 with a ``Retry-After`` header; the circuit breaker does not count it as a failure."""
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            status_code=503,
+            detail=f"Server is overloaded ({reason}), try again later",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take one token. Returns 0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class ClientRateLimiter:
+    """One token bucket per client, for the ``max_clients`` most recently seen clients."""
+
+    def __init__(self, per_minute: float, burst: int, max_clients: int = 10000):
+        self.rate = per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        self.limited = 0
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def check(self, client: str) -> float:
+        """Returns 0 if ``client`` may proceed, else the seconds to wait."""
+        if not self.enabled:
+            return 0.0
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        wait = bucket.take()
+        if wait:
+            self.limited += 1
+            SHED_REQUESTS.inc(reason="rate_limited")
+        return wait
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "clients": len(self._buckets), "limited": self.limited}
+
+
+class AdmissionGate:
+    """Caps concurrent LLM calls and queues the rest by priority class.
+
+    Batch and pre-warm calls may only use ``max_concurrent - reserved`` slots.
+    A freed slot goes to the waiting call with the best priority, oldest first.
+    The expected queue time is the calls ahead times the average slot hold
+    time (an EWMA) over the usable slots.
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int, max_wait_seconds: float = 0.0, reserved: Optional[int] = None):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_wait_seconds = max_wait_seconds
+        self.reserved = max(1, max_concurrent // 4) if reserved is None else reserved
+        self.in_flight = 0
+        self.waiting = 0
+        self.hold_seconds: Optional[float] = None
+        self.shed = {"queue_full": 0, "queue_wait": 0}
+        self._waiters = []
+        self._order = itertools.count()
+
+    def _limit(self, priority: int) -> int:
+        if priority == INTERACTIVE:
+            return self.max_concurrent
+        return max(1, self.max_concurrent - self.reserved)
+
+    def _ahead(self, priority: int) -> int:
+        return sum(1 for p, _, future in self._waiters if p <= priority and not future.done())
+
+    def estimated_wait(self, priority: int = INTERACTIVE) -> float:
+        if self.hold_seconds is None:
+            return 0.0
+        return (self._ahead(priority) + 1) * self.hold_seconds / self._limit(priority)
+
+    def _shed(self, reason: str, retry_after: float) -> Overloaded:
+        self.shed[reason] += 1
+        SHED_REQUESTS.inc(reason=reason)
+        return Overloaded(reason, retry_after)
+
+    def _wake(self) -> None:
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+            elif self.in_flight < self._limit(priority):
+                heapq.heappop(self._waiters)
+                self.in_flight += 1
+                future.set_result(None)
+            else:
+                break
+
+    def _release(self, held_since: float) -> None:
+        held = time.perf_counter() - held_since
+        self.hold_seconds = held if self.hold_seconds is None else 0.2 * held + 0.8 * self.hold_seconds
+        self.in_flight -= 1
+        self._wake()
+
+    async def _acquire(self, priority: int) -> None:
+        if self.in_flight < self._limit(priority) and not self._ahead(priority):
+            self.in_flight += 1
+            return
+        if self.waiting >= self.max_queued:
+            raise self._shed("queue_full", self.estimated_wait(priority) or 1)
+        # Only interactive calls have someone waiting on the answer; queued jobs wait their turn.
+        max_wait = self.max_wait_seconds if priority == INTERACTIVE and self.max_wait_seconds > 0 else None
+        if max_wait is not None and self.estimated_wait(priority) > max_wait:
+            raise self._shed("queue_wait", self.estimated_wait(priority))
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(future, max_wait)
+        except asyncio.TimeoutError:
+            raise self._shed("queue_wait", self.estimated_wait(priority)) from None
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the caller went away.
+                self._release(time.perf_counter())
+            raise
+        finally:
+            self.waiting -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[int] = None):
+        await self._acquire(llm_priority.get() if priority is None else priority)
+        held_since = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release(held_since)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.waiting,
+            "reserved_for_interactive": self.reserved,
+            "avg_hold_seconds": self.hold_seconds,
+            "estimated_wait_seconds": self.estimated_wait(),
+            "shed": dict(self.shed),
+        }
@@ -0,0 +1,253 @@
+"""Result cache for generated quizzes.
+
+Quizzes are cached per normalized (topic, difficulty). A cached quiz with at
+least N questions can answer a request for N questions, so one large
+generation serves every smaller request for the same topic and level.
+
+Entries older than the TTL are no longer returned by ``get`` but are kept for
+``stale_seconds`` more, so ``get_stale`` can still serve them while a fresh
+quiz is generated (stale-while-revalidate).
+
+Async code should call ``aget``, ``aget_stale`` and ``aput``, which run the
+SQLite backend in a worker thread instead of on the event loop.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+def normalize_topic(topic: str) -> str:
+    """Lower-case a topic and collapse runs of whitespace."""
+    return " ".join(topic.split()).lower()
+
+
+def normalize_key(topic: str, difficulty: str) -> Tuple[str, str]:
+    return normalize_topic(topic), difficulty.strip().lower()
+
+
+def _trim(quiz: dict, num_questions: int, items_key: str = "questions") -> Optional[dict]:
+    items = quiz.get(items_key, [])
+    if len(items) < num_questions:
+        return None
+    return {**quiz, items_key: items[:num_questions]}
+
+
+class QuizCache:
+    """Base class: keeps hit/miss counters around a storage backend.
+
+    ``items_key`` names the list a cached entry is trimmed by: ``questions``
+    for quizzes, ``pairs`` for matching games.
+    """
+
+    backend = "none"
+    # Whether lookups do disk I/O and belong in a worker thread.
+    blocking = False
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0, stale_seconds: float = 0.0, items_key: str = "questions"):
+        self.items_key = items_key
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    def get(self, topic: str, difficulty: str, num_questions: int) -> Optional[dict]:
+        quiz = self._load(normalize_key(topic, difficulty))
+        quiz = _trim(quiz, num_questions, self.items_key) if quiz is not None else None
+        if quiz is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return quiz
+
+    def get_stale(self, topic: str, difficulty: str, num_questions: int) -> Optional[dict]:
+        """Like ``get`` but also returns an expired quiz still within ``stale_seconds``."""
+        quiz = self._load(normalize_key(topic, difficulty), stale=True)
+        quiz = _trim(quiz, num_questions, self.items_key) if quiz is not None else None
+        if quiz is not None:
+            self.stale_hits += 1
+        return quiz
+
+    def has_fresh(self, topic: str, difficulty: str, num_questions: int) -> bool:
+        """Whether ``get`` would hit, without counting a hit or miss."""
+        quiz = self._load(normalize_key(topic, difficulty))
+        return quiz is not None and _trim(quiz, num_questions, self.items_key) is not None
+
+    def put(self, topic: str, difficulty: str, quiz: dict) -> None:
+        key = normalize_key(topic, difficulty)
+        existing = self._load(key)
+        # Keep the larger quiz so it can keep answering bigger requests.
+        if existing is not None and len(existing[self.items_key]) > len(quiz[self.items_key]):
+            return
+        self._store(key, quiz)
+
+    async def aget(self, topic: str, difficulty: str, num_questions: int) -> Optional[dict]:
+        return await self._call(self.get, topic, difficulty, num_questions)
+
+    async def aget_stale(self, topic: str, difficulty: str, num_questions: int) -> Optional[dict]:
+        return await self._call(self.get_stale, topic, difficulty, num_questions)
+
+    async def aput(self, topic: str, difficulty: str, quiz: dict) -> None:
+        await self._call(self.put, topic, difficulty, quiz)
+
+    async def _call(self, method, *args):
+        if not self.blocking:
+            return method(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _expired(self, stored_at: float, grace: float = 0.0) -> bool:
+        return self.ttl_seconds > 0 and time.time() - stored_at > self.ttl_seconds + grace
+
+    def _load(self, key: Tuple[str, str], stale: bool = False) -> Optional[dict]:
+        return None
+
+    def _store(self, key: Tuple[str, str], quiz: dict) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return 0
+
+
+class MemoryQuizCache(QuizCache):
+    """In-process LRU cache with TTL expiry."""
+
+    backend = "memory"
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0, stale_seconds: float = 0.0, items_key: str = "questions"):
+        super().__init__(max_entries, ttl_seconds, stale_seconds, items_key)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, dict]]" = OrderedDict()
+
+    def _load(self, key, stale=False):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, quiz = entry
+        if self._expired(stored_at, self.stale_seconds):
+            del self._entries[key]
+            return None
+        if not stale and self._expired(stored_at):
+            return None
+        self._entries.move_to_end(key)
+        return quiz
+
+    def _store(self, key, quiz):
+        self._entries[key] = (time.time(), quiz)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteQuizCache(QuizCache):
+    """On-disk cache that survives restarts; evicts least recently used rows.
+
+    A hit only notes the time in memory. Those ``used_at`` updates are written
+    in one batch before the next store evicts, so reads never write.
+    """
+
+    backend = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int = 1024, ttl_seconds: float = 3600.0, stale_seconds: float = 0.0, items_key: str = "questions"):
+        super().__init__(max_entries, ttl_seconds, stale_seconds, items_key)
+        self.path = path
+        self._lock = threading.Lock()
+        self._used: Dict[Tuple[str, str], float] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS quiz_cache (
+                topic TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                quiz TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                used_at REAL NOT NULL,
+                PRIMARY KEY (topic, difficulty)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS quiz_cache_used_at ON quiz_cache (used_at)")
+        self._conn.commit()
+
+    def _load(self, key, stale=False):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT quiz, stored_at FROM quiz_cache WHERE topic = ? AND difficulty = ?", key
+            ).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[1], self.stale_seconds):
+                self._conn.execute("DELETE FROM quiz_cache WHERE topic = ? AND difficulty = ?", key)
+                self._conn.commit()
+                self._used.pop(key, None)
+                return None
+            if not stale and self._expired(row[1]):
+                return None
+            self._used[key] = time.time()
+        return json.loads(row[0])
+
+    def _store(self, key, quiz):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE quiz_cache SET used_at = ? WHERE topic = ? AND difficulty = ?",
+                [(used_at, *used_key) for used_key, used_at in self._used.items()],
+            )
+            self._used.clear()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO quiz_cache (topic, difficulty, quiz, stored_at, used_at) VALUES (?, ?, ?, ?, ?)",
+                (*key, json.dumps(quiz), now, now),
+            )
+            self._conn.execute(
+                """
+                DELETE FROM quiz_cache WHERE rowid IN (
+                    SELECT rowid FROM quiz_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM quiz_cache").fetchone()[0]
+
+
+def create_quiz_cache(path_variable: str = "QUIZ_CACHE_PATH", default_path: str = "quiz-cache.sqlite3", items_key: str = "questions") -> QuizCache:
+    """Build the cache selected by the QUIZ_CACHE_* environment variables.
+
+    ``path_variable`` and ``default_path`` pick the SQLite file, so another
+    kind of content can have a cache of its own with the same settings.
+    """
+    backend = os.getenv("QUIZ_CACHE_BACKEND", "memory").lower()
+    max_entries = int(os.getenv("QUIZ_CACHE_MAX_ENTRIES", "1024"))
+    ttl_seconds = float(os.getenv("QUIZ_CACHE_TTL_SECONDS", "3600"))
+    stale_seconds = float(os.getenv("QUIZ_CACHE_STALE_SECONDS", "86400"))
+    if backend == "memory":
+        return MemoryQuizCache(max_entries, ttl_seconds, stale_seconds, items_key)
+    if backend == "sqlite":
+        path = os.getenv(path_variable, default_path)
+        return SQLiteQuizCache(path, max_entries, ttl_seconds, stale_seconds, items_key)
+    if backend == "none":
+        return QuizCache(max_entries, ttl_seconds, stale_seconds, items_key)
+    raise ValueError(f"Unknown QUIZ_CACHE_BACKEND: {backend}")
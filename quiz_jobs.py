@@ -0,0 +1,384 @@
+"""Durable quiz generation jobs and background pre-warming.
+
+``JobQueue`` stores jobs in SQLite, so queued work survives a restart. A job
+claimed by a process that dies is picked up again once its lease expires.
+``JobWorkers`` runs a pool of asyncio worker tasks that claim jobs and run
+them through a caller-supplied coroutine. Async code uses the queue's
+``a``-prefixed methods, which run SQLite in a worker thread: another process
+holding the database must not stall the event loop. Callers can wait for a job to
+change state, which the long-poll and websocket endpoints use.
+``PrewarmScheduler`` queues low-priority jobs for the topic x difficulty
+grid while the server is idle, until a rolling token budget is spent.
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from quiz_metrics import log_event
+
+USER_PRIORITY = 0
+PREWARM_PRIORITY = 10
+TERMINAL_STATES = ("done", "failed")
+
+_COLUMNS = (
+    "id, kind, topic, difficulty, num_questions, status, priority, attempts, "
+    "result, error, tokens, created_at, started_at, finished_at"
+)
+
+
+async def _in_thread(function, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+def _row_to_job(row) -> dict:
+    job = dict(zip([column.strip() for column in _COLUMNS.split(",")], row))
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+class JobQueue:
+    """SQLite-backed job table; lower ``priority`` values are claimed first.
+
+    A job is attempted at most ``max_attempts`` times, including attempts
+    whose worker died and left the job running past its lease.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 600.0, max_attempts: int = 2, retention_seconds: float = 86400.0):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+        # Autocommit mode so claim() can take the write lock with BEGIN IMMEDIATE.
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                num_questions INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                tokens INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority, created_at);
+            CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (kind, finished_at);
+            """
+        )
+
+    def submit(self, topic: str, difficulty: str, num_questions: int, kind: str = "user", priority: int = USER_PRIORITY) -> dict:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, topic, difficulty, num_questions, status, priority, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, topic, difficulty, num_questions, priority, time.time()),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row is not None else None
+
+    def claim(self) -> Optional[dict]:
+        """Mark the next runnable job as running and return it.
+
+        Jobs left running past their lease, by a worker that died, count as
+        runnable again, unless they have used up their attempts; those fail.
+        """
+        now = time.time()
+        expired = now - self.lease_seconds
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    """
+                    UPDATE jobs SET status = 'failed', error = 'Worker stopped before finishing the job', finished_at = ?
+                    WHERE status = 'running' AND started_at < ? AND attempts >= ?
+                    """,
+                    (now, expired, self.max_attempts),
+                )
+                row = self._conn.execute(
+                    f"""
+                    SELECT {_COLUMNS} FROM jobs
+                    WHERE status = 'queued' OR (status = 'running' AND started_at < ? AND attempts < ?)
+                    ORDER BY priority, created_at LIMIT 1
+                    """,
+                    (expired, self.max_attempts),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ?, attempts = attempts + 1 WHERE id = ?",
+                        (now, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return {**_row_to_job(row), "status": "running", "started_at": now, "attempts": row[7] + 1}
+
+    def complete(self, job_id: str, result: dict, tokens: int = 0) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, tokens = tokens + ?, error = NULL, finished_at = ? WHERE id = ?",
+                (json.dumps(result), tokens, time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str, tokens: int = 0) -> bool:
+        """Record a failed attempt. Returns True if the job was queued for a retry."""
+        with self._lock:
+            attempts = self._conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            retry = attempts is not None and attempts[0] < self.max_attempts
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, tokens = tokens + ?, finished_at = ? WHERE id = ?",
+                ("queued" if retry else "failed", error, tokens, None if retry else time.time(), job_id),
+            )
+        return retry
+
+    def pending(self, kind: Optional[str] = None) -> int:
+        query = "SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')"
+        params: Tuple = ()
+        if kind is not None:
+            query += " AND kind = ?"
+            params = (kind,)
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0]
+
+    def tokens_spent(self, kind: str, since: float) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COALESCE(SUM(tokens), 0) FROM jobs WHERE kind = ? AND finished_at >= ?", (kind, since)
+            ).fetchone()[0]
+
+    def purge(self) -> int:
+        """Delete finished jobs older than ``retention_seconds``."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - self.retention_seconds,),
+            )
+        return cursor.rowcount
+
+    async def asubmit(self, topic: str, difficulty: str, num_questions: int, kind: str = "user", priority: int = USER_PRIORITY) -> dict:
+        return await _in_thread(self.submit, topic, difficulty, num_questions, kind, priority)
+
+    async def aget(self, job_id: str) -> Optional[dict]:
+        return await _in_thread(self.get, job_id)
+
+    async def aclaim(self) -> Optional[dict]:
+        return await _in_thread(self.claim)
+
+    async def acomplete(self, job_id: str, result: dict, tokens: int = 0) -> None:
+        await _in_thread(self.complete, job_id, result, tokens)
+
+    async def afail(self, job_id: str, error: str, tokens: int = 0) -> bool:
+        return await _in_thread(self.fail, job_id, error, tokens)
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status").fetchall()
+        stats = {}
+        for kind, status, count in rows:
+            stats.setdefault(kind, {})[status] = count
+        return stats
+
+
+class JobError(Exception):
+    """A failed job attempt, carrying the tokens it spent before failing."""
+
+    def __init__(self, message: str, tokens: int = 0):
+        super().__init__(message)
+        self.tokens = tokens
+
+
+class JobWorkers:
+    """A pool of asyncio tasks that claim jobs from a ``JobQueue`` and run them.
+
+    ``run_job(job)`` returns ``(result, tokens)``; an exception fails the
+    attempt, and a ``JobError`` also records the tokens it carries. Workers
+    poll every ``poll_seconds`` as well as when woken, so jobs queued by other
+    processes are picked up too.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        run_job: Callable[[dict], Awaitable[Tuple[dict, int]]],
+        workers: int = 2,
+        poll_seconds: float = 1.0,
+    ):
+        self.queue = queue
+        self.run_job = run_job
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.running = 0
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = None
+        self._waiters: Dict[str, Set[asyncio.Event]] = {}
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, topic: str, difficulty: str, num_questions: int, kind: str = "user", priority: int = USER_PRIORITY) -> dict:
+        job = await self.queue.asubmit(topic, difficulty, num_questions, kind, priority)
+        self.wake()
+        return job
+
+    def wake(self) -> None:
+        """Have an idle worker look for a job now instead of at its next poll."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def wait_for_update(self, job_id: str, timeout: float) -> None:
+        """Return when the job changes state in this process, or after ``timeout``."""
+        event = asyncio.Event()
+        events = self._waiters.setdefault(job_id, set())
+        events.add(event)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # Jobs finished by another process, or purged, never notify here.
+            events.discard(event)
+            if not events and self._waiters.get(job_id) is events:
+                del self._waiters[job_id]
+
+    def _notify(self, job_id: str) -> None:
+        for event in self._waiters.pop(job_id, ()):
+            event.set()
+
+    async def _work(self) -> None:
+        while True:
+            job = await self.queue.aclaim()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._notify(job["id"])
+            self.running += 1
+            try:
+                result, tokens = await self.run_job(job)
+            except asyncio.CancelledError:
+                # Left as running; another worker reclaims it when the lease expires.
+                raise
+            except Exception as e:
+                await self.queue.afail(job["id"], str(e), e.tokens if isinstance(e, JobError) else 0)
+            else:
+                await self.queue.acomplete(job["id"], result, tokens)
+            finally:
+                self.running -= 1
+            self._notify(job["id"])
+
+    def stats(self) -> dict:
+        return {"workers": len(self._tasks), "running": self.running, "jobs": self.queue.stats()}
+
+
+class PrewarmScheduler:
+    """Queues pre-generation jobs for a topic x difficulty grid when idle.
+
+    Every ``interval_seconds`` it asks ``wanted()`` which (topic, difficulty)
+    pairs still need a quiz. If ``idle()`` agrees, no pre-warm job is pending
+    and the token budget for the last ``budget_window_seconds`` is not spent,
+    it queues one job at pre-warm priority. One job at a time keeps the
+    budget check close to actual spending.
+    """
+
+    def __init__(
+        self,
+        workers: JobWorkers,
+        wanted: Callable[[], Iterable[Tuple[str, str]]],
+        idle: Callable[[], bool],
+        token_budget: int,
+        budget_window_seconds: float = 86400.0,
+        num_questions: int = 10,
+        interval_seconds: float = 30.0,
+    ):
+        self.workers = workers
+        self.wanted = wanted
+        self.idle = idle
+        self.token_budget = token_budget
+        self.budget_window_seconds = budget_window_seconds
+        self.num_questions = num_questions
+        self.interval_seconds = interval_seconds
+        self.scheduled = 0
+        self._task = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.token_budget > 0
+
+    def tokens_spent(self) -> int:
+        return self.workers.queue.tokens_spent("prewarm", time.time() - self.budget_window_seconds)
+
+    def start(self) -> None:
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def tick(self) -> Optional[dict]:
+        """Queue the next pre-warm job if there is room for one.
+
+        This does blocking SQLite calls; ``_run`` calls it in a worker thread.
+        """
+        queue = self.workers.queue
+        if queue.pending("prewarm") or queue.pending("user") or not self.idle():
+            return None
+        if self.tokens_spent() >= self.token_budget:
+            return None
+        for topic, difficulty in self.wanted():
+            self.scheduled += 1
+            return queue.submit(topic, difficulty, self.num_questions, kind="prewarm", priority=PREWARM_PRIORITY)
+        return None
+
+    def _purge_and_tick(self) -> Optional[dict]:
+        self.workers.queue.purge()
+        return self.tick()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await _in_thread(self._purge_and_tick) is not None:
+                    self.workers.wake()
+            except Exception as e:
+                log_event("prewarm_error", error=str(e))
+            await asyncio.sleep(self.interval_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "scheduled": self.scheduled,
+            "token_budget": self.token_budget,
+            "tokens_spent": self.tokens_spent() if self.enabled else 0,
+        }
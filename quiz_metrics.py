@@ -0,0 +1,277 @@
+"""Per-request tracing and Prometheus metrics.
+
+A ``Trace`` follows one API request through its stages (prompt build, queue
+wait, time to first token, LLM call, JSON extraction, validation, fallback)
+and collects its token counts. The active trace lives in a context variable,
+so the LLM helpers record into it without extra arguments, and tasks spawned
+for shards or coalesced generations inherit it. Every stage is also observed
+in a histogram exported by ``render_metrics`` in the Prometheus text format.
+
+Finished traces and sampled raw LLM output are written as JSON lines by a
+background thread, so logging never blocks the event loop.
+"""
+import contextvars
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+# Fraction of finished request traces and of raw LLM completions to log.
+TRACE_SAMPLE_RATE = float(os.getenv("QUIZ_TRACE_SAMPLE_RATE", "1.0"))
+RAW_OUTPUT_SAMPLE_RATE = float(os.getenv("QUIZ_RAW_OUTPUT_SAMPLE_RATE", "0.01"))
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Dict[tuple, float]:
+        """Current values keyed by label values, in ``labels`` order."""
+        return dict(self._values)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts, sum, count]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labels)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+                break
+        entry[1] += value
+        entry[2] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, key, 'le="%s"' % _format_value(bound))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {count}"
+
+
+class Gauge:
+    """A value read from ``fn`` each time metrics are rendered."""
+
+    def __init__(self, name: str, documentation: str, fn: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.fn = fn
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {_format_value(self.fn())}"
+
+
+METRICS = []
+
+
+def register(metric):
+    METRICS.append(metric)
+    return metric
+
+
+def gauge(name: str, documentation: str, fn: Callable[[], float]) -> Gauge:
+    return register(Gauge(name, documentation, fn))
+
+
+def render_metrics() -> str:
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+
+REQUESTS = register(Counter("quiz_requests_total", "Quiz API requests by endpoint and source", ("endpoint", "source")))
+REQUEST_SECONDS = register(Histogram(
+    "quiz_request_duration_seconds", "Quiz API request latency by endpoint and source", ("endpoint", "source")
+))
+STAGE_SECONDS = register(Histogram("quiz_stage_duration_seconds", "Time spent in each request stage", ("stage",)))
+LLM_TOKENS = register(Counter("quiz_llm_tokens_total", "LLM tokens by direction", ("direction",)))
+LLM_CALL_TOKENS = register(Histogram(
+    "quiz_llm_call_tokens", "Tokens per LLM call by direction", ("direction",), buckets=TOKEN_BUCKETS
+))
+LLM_ERRORS = register(Counter("quiz_llm_errors_total", "Failed LLM generations by endpoint", ("endpoint",)))
+DEADLINE_MISSES = register(Counter(
+    "quiz_deadline_misses_total", "Requests answered with a fallback because generation missed the deadline", ("endpoint",)
+))
+SHED_REQUESTS = register(Counter(
+    "quiz_requests_shed_total", "Requests and LLM calls turned away by admission control", ("reason",)
+))
+
+
+class BackgroundLog:
+    """Writes lines to a stream from a daemon thread.
+
+    ``write`` only enqueues; when the queue is full the line is dropped and
+    counted rather than making the caller wait.
+    """
+
+    def __init__(self, stream=sys.stdout, max_pending: int = 1000):
+        self.stream = stream
+        self.dropped = 0
+        self._queue = queue.Queue(max_pending)
+        self._thread = None
+
+    def write(self, line: str) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="quiz-log", daemon=True)
+            self._thread.start()
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            line = self._queue.get()
+            try:
+                self.stream.write(line + "\n")
+                self.stream.flush()
+            except Exception:
+                self.dropped += 1
+
+
+background_log = BackgroundLog()
+gauge("quiz_log_lines_dropped", "Log lines dropped because the log queue was full", lambda: background_log.dropped)
+
+
+def log_event(event: str, **fields) -> None:
+    trace = current_trace.get()
+    if trace is not None:
+        fields = {"trace": trace.id, **fields}
+    background_log.write(json.dumps({"event": event, **fields}, ensure_ascii=False, default=str))
+
+
+class Trace:
+    def __init__(self, endpoint: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.endpoint = endpoint
+        self.source = None
+        self.stages: Dict[str, float] = {}
+        self.llm_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.started = time.perf_counter()
+
+    def to_dict(self, duration: float) -> dict:
+        return {
+            "trace": self.id,
+            "endpoint": self.endpoint,
+            "source": self.source,
+            "duration": round(duration, 6),
+            "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            "llm_calls": self.llm_calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+        }
+
+
+current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+@contextmanager
+def start_trace(endpoint: str):
+    """Trace one request; its source defaults to "error" if it raises."""
+    trace = Trace(endpoint)
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    except BaseException:
+        trace.source = trace.source or "error"
+        raise
+    finally:
+        current_trace.reset(token)
+        duration = time.perf_counter() - trace.started
+        source = trace.source or "unknown"
+        REQUESTS.inc(endpoint=endpoint, source=source)
+        REQUEST_SECONDS.observe(duration, endpoint=endpoint, source=source)
+        if random.random() < TRACE_SAMPLE_RATE:
+            background_log.write(json.dumps({"event": "trace", **trace.to_dict(duration)}))
+
+
+def set_source(source: str) -> None:
+    trace = current_trace.get()
+    if trace is not None:
+        trace.source = source
+
+
+def record_stage(name: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=name)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.stages[name] = trace.stages.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+
+def record_llm_call(input_tokens: int, output_tokens: int) -> None:
+    LLM_TOKENS.inc(input_tokens, direction="input")
+    LLM_TOKENS.inc(output_tokens, direction="output")
+    LLM_CALL_TOKENS.observe(input_tokens, direction="input")
+    LLM_CALL_TOKENS.observe(output_tokens, direction="output")
+    trace = current_trace.get()
+    if trace is not None:
+        trace.llm_calls += 1
+        trace.input_tokens += input_tokens
+        trace.output_tokens += output_tokens
+
+
+def log_raw_output(text: str, input_tokens: int) -> None:
+    """Log a sampled fraction of raw LLM completions."""
+    if random.random() < RAW_OUTPUT_SAMPLE_RATE:
+        log_event("raw_llm_output", input_tokens=input_tokens, output=text)
@@ -0,0 +1,224 @@
+"""Prompt construction for quiz generation.
+
+Every prompt starts with the same system message (instructions and output
+schema), compiled once at import, so provider-side prefix caching can reuse
+it. Everything that depends on the request goes in the user message after it:
+the few-shot examples picked for the topic and the topic, difficulty and
+question count. There is one system message per output format (see
+``quiz_wire``).
+
+Token counts use tiktoken when it is installed. Its encoding is loaded on the
+first count, not at import, because a cold machine downloads it first; the
+server loads it in a worker thread at startup.
+"""
+import functools
+import json
+import math
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from quiz_metrics import log_event
+from quiz_wire import COMPACT_FORMAT, JSON_FORMAT, encode_compact
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to a characters-per-token estimate
+    tiktoken = None
+
+
+@functools.lru_cache(maxsize=None)
+def load_encoding():
+    """The tiktoken encoding, loaded once; None means counts are estimated."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:  # the encoding file is downloaded on first use
+        log_event("tokenizer_unavailable", error=str(e))
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = load_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+# Few-shot examples and system prompts are counted on every prompt build.
+_count_fixed_tokens = functools.lru_cache(maxsize=1024)(count_tokens)
+
+
+def tokenizer_name() -> str:
+    if tiktoken is None:
+        return "estimate"
+    if not load_encoding.cache_info().currsize:
+        return "tiktoken (not loaded yet)"
+    return "tiktoken" if load_encoding() is not None else "estimate"
+
+
+SYSTEM_PROMPT = """You write multiple choice quizzes as JSON.
+Replace all placeholder texts with real content.
+Do NOT include any text before or after the JSON.
+Return ONLY the JSON object with this exact structure:
+{
+    "title": "Quiz Title",
+    "description": "Quiz description",
+    "questions": [
+        {
+            "id": 1,
+            "question": "Replace this with an actual question about the topic.",
+            "options": ["Real Option 1", "Real Option 2", "Real Option 3", "Real Option 4"],
+            "correct_answer": 0,
+            "explanation": "Replace this with an explanation."
+        }
+    ]
+}
+
+Requirements:
+- Each question must have exactly 4 options.
+- correct_answer must be the index (0-3) of the correct option.
+- Questions should be engaging and educational.
+- Explanations must be clear and informative.
+- Ensure the JSON is valid.
+"""
+
+COMPACT_SYSTEM_PROMPT = """You write multiple choice quizzes as compact JSON.
+Replace all placeholder texts with real content.
+Do NOT include any text before or after the JSON.
+Return ONLY a JSON object of this exact form, where "t" is the title, "d" the
+description and each entry of "q" is [question, [4 options], index of the
+correct option (0-3), explanation]:
+{"t": "Quiz Title", "d": "Quiz description", "q": [["Real question?", ["Option 1", "Option 2", "Option 3", "Option 4"], 0, "Real explanation."]]}
+
+Requirements:
+- Each question must have exactly 4 options.
+- Questions should be engaging and educational.
+- Explanations must be clear and informative.
+- Ensure the JSON is valid.
+"""
+
+SYSTEM_PROMPTS = {JSON_FORMAT: SYSTEM_PROMPT, COMPACT_FORMAT: COMPACT_SYSTEM_PROMPT}
+
+
+def _terms(text: str) -> set:
+    return {word for word in re.findall(r"[a-z0-9]+", text.lower()) if len(word) > 2}
+
+
+def _avoid_lines(questions: Sequence[str]) -> str:
+    if not questions:
+        return ""
+    avoid = "\n".join(f"- {question}" for question in questions)
+    return f"Do not repeat any of these questions:\n{avoid}\n"
+
+
+class FewShotExample(NamedTuple):
+    topic: str
+    text: str
+    terms: frozenset
+
+    @property
+    def tokens(self) -> int:
+        return _count_fixed_tokens(self.text)
+
+
+class QuizPrompt(NamedTuple):
+    messages: List[dict]
+    input_tokens: int
+
+
+class QuizPromptBuilder:
+    """Builds chat messages for quiz generation within a few-shot token budget.
+
+    Examples are ranked by how many words they share with the requested topic
+    (and focus) and added while they fit in ``few_shot_token_budget``. When no
+    example is related, the first one is still included to anchor the format.
+    """
+
+    def __init__(self, examples: List[FewShotExample], few_shot_token_budget: int = 400, output_format: str = JSON_FORMAT):
+        self.examples = examples
+        self.few_shot_token_budget = few_shot_token_budget
+        self.output_format = output_format
+        self.system_prompt = SYSTEM_PROMPTS[output_format]
+        self.prompts_built = 0
+        self.input_tokens = 0
+
+    @classmethod
+    def from_quizzes(
+        cls,
+        quizzes: Dict[str, List[dict]],
+        few_shot_token_budget: int = 400,
+        output_format: str = JSON_FORMAT,
+        questions_per_example: int = 2,
+    ):
+        """Turn {topic: questions} into one-line examples in the output format."""
+        examples = []
+        for topic, questions in quizzes.items():
+            sample = [
+                {"id": i + 1, **{key: q[key] for key in ("question", "options", "correct_answer", "explanation")}}
+                for i, q in enumerate(questions[:questions_per_example])
+            ]
+            quiz = {"title": f"{topic} Quiz", "description": f"A medium difficulty quiz about {topic}", "questions": sample}
+            text = encode_compact(quiz) if output_format == COMPACT_FORMAT else json.dumps(quiz, ensure_ascii=False)
+            terms = _terms(topic) | set().union(*(_terms(q["question"]) for q in sample))
+            examples.append(FewShotExample(topic, text, frozenset(terms)))
+        return cls(examples, few_shot_token_budget, output_format)
+
+    @property
+    def system_prompt_tokens(self) -> int:
+        return _count_fixed_tokens(self.system_prompt)
+
+    def select_examples(self, topic: str, focus: Optional[str] = None) -> List[FewShotExample]:
+        wanted = _terms(topic) | (_terms(focus) if focus else set())
+        scored = sorted(
+            ((len(wanted & example.terms), i) for i, example in enumerate(self.examples)),
+            key=lambda item: (-item[0], item[1]),
+        )
+        chosen = []
+        budget = self.few_shot_token_budget
+        for score, i in scored:
+            example = self.examples[i]
+            if (score or not chosen) and example.tokens <= budget:
+                chosen.append(example)
+                budget -= example.tokens
+            if not score and chosen:
+                break
+        return chosen
+
+    def _prompt(self, user_content: str) -> QuizPrompt:
+        input_tokens = self.system_prompt_tokens + count_tokens(user_content)
+        self.prompts_built += 1
+        self.input_tokens += input_tokens
+        messages = [
+            {"role": "system", "content": self.system_prompt},
+            {"role": "user", "content": user_content},
+        ]
+        return QuizPrompt(messages, input_tokens)
+
+    def build(self, topic: str, difficulty: str, num_questions: int, focus: Optional[str] = None, avoid: Sequence[str] = ()) -> QuizPrompt:
+        examples = "\n".join(
+            f"Example {i} ({example.topic}):\n{example.text}"
+            for i, example in enumerate(self.select_examples(topic, focus), 1)
+        )
+        focus_line = f"Focus the questions on {focus}.\n" if focus else ""
+        return self._prompt(
+            f"{examples}\n\n"
+            f"Now, generate a {difficulty} difficulty quiz about {topic} with {num_questions} multiple choice questions.\n"
+            f"{focus_line}{_avoid_lines(avoid)}"
+        )
+
+    def build_repair(self, topic: str, difficulty: str, num_questions: int, existing: Sequence[str]) -> QuizPrompt:
+        return self._prompt(
+            f"Generate a {difficulty} difficulty quiz about {topic} with {num_questions} multiple choice questions.\n"
+            f"{_avoid_lines(existing)}"
+        )
+
+    def stats(self) -> dict:
+        return {
+            "prompts_built": self.prompts_built,
+            "input_tokens": self.input_tokens,
+            "avg_input_tokens": self.input_tokens / self.prompts_built if self.prompts_built else 0.0,
+            "output_format": self.output_format,
+            "system_prompt_tokens": self.system_prompt_tokens,
+            "tokenizer": tokenizer_name(),
+        }
@@ -0,0 +1,64 @@
+"""Incremental parsing of a quiz JSON object as it streams out of the LLM."""
+import json
+from typing import List
+
+
+class QuestionStreamParser:
+    """Yields each object of the top-level ``questions`` array once it closes.
+
+    Text is fed in arbitrary chunks. The parser tracks string and escape state
+    so braces inside string values are ignored, and it only reports items
+    that sit directly inside an array of the outermost JSON object. Items are
+    objects by default; pass ``item="["`` for the compact wire format, where
+    each question is an array.
+    """
+
+    def __init__(self, item: str = "{"):
+        self._open = item
+        self._close = "}" if item == "{" else "]"
+        self._buffer = []
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+        self._object_start = None
+        self._pos = 0
+        self.done = False
+
+    def feed(self, chunk: str) -> List:
+        questions = []
+        for char in chunk:
+            self._buffer.append(char)
+            pos = self._pos
+            self._pos += 1
+            if self.done:
+                continue
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"' and self._stack:
+                self._in_string = True
+            elif char in "{[":
+                if char == self._open and self._stack == ["{", "["]:
+                    self._object_start = pos
+                self._stack.append(char)
+            elif char in "}]" and self._stack:
+                self._stack.pop()
+                if char == self._close and self._stack == ["{", "["] and self._object_start is not None:
+                    text = "".join(self._buffer[self._object_start:pos + 1])
+                    self._object_start = None
+                    try:
+                        questions.append(json.loads(text))
+                    except ValueError:
+                        pass
+                elif not self._stack:
+                    self.done = True
+        return questions
+
+    @property
+    def text(self) -> str:
+        return "".join(self._buffer)
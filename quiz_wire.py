@@ -0,0 +1,55 @@
+"""Compact wire format for LLM quiz output.
+
+Instead of repeating ``"question"``, ``"options"``, ``"correct_answer"``,
+``"explanation"`` and ``"id"`` for every question, the model writes each
+question as a positional array and the server assigns ids:
+
+    {"t": "Title", "d": "Description", "q": [["Question?", ["A", "B", "C", "D"], 2, "Explanation."], ...]}
+
+``decode_compact`` expands this into the regular quiz dict used by the
+``QuizResponse`` model.
+"""
+import json
+from typing import Optional
+
+JSON_FORMAT = "json"
+COMPACT_FORMAT = "compact"
+OUTPUT_FORMATS = (JSON_FORMAT, COMPACT_FORMAT)
+
+
+def encode_compact_question(question: dict) -> list:
+    return [question["question"], question["options"], question["correct_answer"], question["explanation"]]
+
+
+def encode_compact(quiz: dict) -> str:
+    return json.dumps(
+        {"t": quiz["title"], "d": quiz["description"], "q": [encode_compact_question(q) for q in quiz["questions"]]},
+        ensure_ascii=False,
+    )
+
+
+def decode_compact_question(item, question_id: int) -> Optional[dict]:
+    """Expand one positional question, or return None if it has the wrong shape."""
+    if not isinstance(item, list) or len(item) != 4:
+        return None
+    question, options, correct_answer, explanation = item
+    return {
+        "id": question_id,
+        "question": question,
+        "options": options,
+        "correct_answer": correct_answer,
+        "explanation": explanation,
+    }
+
+
+def decode_compact(obj: dict) -> dict:
+    """Expand a compact quiz object into the regular quiz dict.
+
+    Items that are not four-element arrays are passed through unchanged so the
+    usual per-question validation can reject them.
+    """
+    items = obj.get("q")
+    questions = None
+    if isinstance(items, list):
+        questions = [decode_compact_question(item, i + 1) or item for i, item in enumerate(items)]
+    return {"title": obj.get("t"), "description": obj.get("d"), "questions": questions}
@@ -0,0 +1,72 @@
+"""Responses serialized once and served as immutable bytes.
+
+The topic and difficulty lists and the fallback quizzes never change while the
+server runs, and they are what clients get when the LLM is down, so they are
+encoded, gzipped and hashed up front. Serving one is a header check and a
+bytes write: no Pydantic validation and no JSON encoding per request.
+"""
+import gzip
+import hashlib
+import json
+from typing import Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Bodies smaller than this are not worth a gzip round trip on the client.
+MIN_GZIP_SIZE = 256
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "").lower() not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: a W/ prefix added by a proxy still counts as a match.
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class StaticResponse:
+    """A JSON body with its gzip variant and ETags, built once.
+
+    ``response(request)`` answers ``If-None-Match`` with 304 and sends the
+    gzip body when the client accepts it. Each encoding gets its own ETag.
+    """
+
+    def __init__(self, content, cache_control: Optional[str] = None):
+        self.content = content
+        self.body = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+        digest = hashlib.sha1(self.body).hexdigest()[:16]
+        self.etag = f'"{digest}"'
+        self.gzip_body = None
+        self.gzip_etag = None
+        if len(self.body) >= MIN_GZIP_SIZE:
+            compressed = gzip.compress(self.body, compresslevel=9, mtime=0)
+            if len(compressed) < len(self.body):
+                self.gzip_body = compressed
+                self.gzip_etag = f'"{digest}-gzip"'
+        self.cache_control = cache_control
+
+    def response(self, request: Optional[Request] = None, status_code: int = 200) -> Response:
+        body, etag, headers = self.body, self.etag, {"Vary": "Accept-Encoding"}
+        if request is not None and self.gzip_body is not None and accepts_gzip(request.headers.get("accept-encoding", "")):
+            body, etag = self.gzip_body, self.gzip_etag
+            headers["Content-Encoding"] = "gzip"
+        headers["ETag"] = etag
+        if self.cache_control:
+            headers["Cache-Control"] = self.cache_control
+        if request is not None and status_code == 200:
+            if_none_match = request.headers.get("if-none-match")
+            if if_none_match and (etag_matches(if_none_match, self.etag) or etag_matches(if_none_match, etag)):
+                headers.pop("Content-Encoding", None)
+                return Response(status_code=304, headers=headers)
+        return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+    def stats(self) -> dict:
+        return {"bytes": len(self.body), "gzip_bytes": len(self.gzip_body) if self.gzip_body is not None else None}
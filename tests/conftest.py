@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from harness import load_server  # noqa: E402  (also puts the repo root on sys.path)
+
+
+@pytest.fixture
+def make_server(tmp_path, monkeypatch):
+    """Load quiz-server.py with the fake backend, an in-memory cache and files under ``tmp_path``.
+
+    Keyword arguments override QUIZ_* settings for this test only.
+    """
+    monkeypatch.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    def make(**overrides):
+        env = {
+            "QUIZ_CACHE_BACKEND": "memory",
+            "QUIZ_JOBS_PATH": ":memory:",
+            "QUIZ_IMAGE_CACHE_DIR": str(tmp_path / "images"),
+            **overrides,
+        }
+        for name, value in env.items():
+            monkeypatch.setenv(name, value)
+        return load_server(**env)
+
+    return make
+
+
+@pytest.fixture
+def server(make_server):
+    return make_server()
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from harness import asgi_request
+from quiz_admission import BATCH, INTERACTIVE, Overloaded
+
+
+def test_shed_shards_answer_503_in_reject_mode(make_server, monkeypatch):
+    server = make_server(QUIZ_SHED_MODE="reject", QUIZ_SHARD_SIZE="2")
+
+    async def shed(*args, **kwargs):
+        raise Overloaded("queue full", 2.0)
+
+    monkeypatch.setattr(server, "generate_quiz_with_langchain", shed)
+
+    status, _ = asyncio.run(asgi_request(server.app, "POST", "/api/generate-quiz", {"topic": "Art", "difficulty": "easy", "num_questions": 6}))
+
+    assert status == 503
+
+
+def test_unknown_shed_mode_is_rejected_at_startup(make_server):
+    with pytest.raises(ValueError, match="QUIZ_SHED_MODE"):
+        make_server(QUIZ_SHED_MODE="drop")
+
+
+def _record_priorities(server, monkeypatch):
+    priorities = []
+
+    async def refresh(topic, difficulty, num_questions):
+        priorities.append(server.llm_priority.get())
+        await asyncio.sleep(0.1)
+        return server.QuizResponse(title="Art Quiz", description="", questions=[])
+
+    monkeypatch.setattr(server, "refresh_cached_quiz", refresh)
+    return priorities
+
+
+def test_interactive_request_does_not_join_a_batch_generation(server, monkeypatch):
+    priorities = _record_priorities(server, monkeypatch)
+    job = {"topic": "Art", "difficulty": "easy", "num_questions": 3, "kind": "user"}
+
+    async def main():
+        batch = asyncio.create_task(server.run_quiz_job(job))
+        await asyncio.sleep(0.01)
+        await asgi_request(server.app, "POST", "/api/generate-quiz", {"topic": "Art", "difficulty": "easy", "num_questions": 3})
+        await batch
+
+    asyncio.run(main())
+
+    assert priorities == [BATCH, INTERACTIVE]
+    assert server.quiz_flights.coalesced == 0
+
+
+def test_job_joins_a_running_interactive_generation(server, monkeypatch):
+    priorities = _record_priorities(server, monkeypatch)
+    job = {"topic": "Art", "difficulty": "easy", "num_questions": 3, "kind": "prewarm"}
+
+    async def main():
+        request = asyncio.create_task(
+            asgi_request(server.app, "POST", "/api/generate-quiz", {"topic": "Art", "difficulty": "easy", "num_questions": 3})
+        )
+        await asyncio.sleep(0.01)
+        await server.run_quiz_job(job)
+        await request
+
+    asyncio.run(main())
+
+    assert priorities == [INTERACTIVE]
+    assert server.quiz_flights.coalesced == 1
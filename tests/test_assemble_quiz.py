@@ -0,0 +1,55 @@
+import asyncio
+import threading
+
+from question_bank import QuestionBank
+
+
+def _question(i: int, text: str) -> dict:
+    return {"id": i, "question": text, "options": ["A", "B", "C", "D"], "correct_answer": 0, "explanation": f"{text} A."}
+
+
+def test_top_up_avoids_banked_questions_and_repeats_until_full(server, tmp_path, monkeypatch):
+    bank = QuestionBank(str(tmp_path / "bank.sqlite3"))
+    banked = ["Who painted the Mona Lisa?", "Which river flows through Cairo?"]
+    bank.add_questions("Art", "easy", [_question(i, text) for i, text in enumerate(banked, 1)])
+    monkeypatch.setattr(server, "question_bank", bank)
+    fresh = iter(["What is the capital of Peru?", "Which planet has the most moons?"])
+    calls = []
+
+    async def generate(topic, difficulty, num_questions, avoid=()):
+        calls.append((num_questions, sorted(avoid)))
+        # The first top-up only repeats a banked question, which the merge drops.
+        texts = [banked[0]] if len(calls) == 1 else [next(fresh) for _ in range(num_questions)]
+        return server.QuizResponse(title="Art Quiz", description="", questions=[_question(i, text) for i, text in enumerate(texts, 1)])
+
+    monkeypatch.setattr(server, "generate_quiz_sharded", generate)
+
+    quiz = asyncio.run(server.assemble_quiz("Art", "easy", 4))
+
+    assert calls == [(2, sorted(banked)), (2, sorted(banked))]
+    assert len(quiz.questions) == 4
+    assert [question.id for question in quiz.questions] == [1, 2, 3, 4]
+
+
+def test_search_limit_is_clamped(server, tmp_path, monkeypatch):
+    bank = QuestionBank(str(tmp_path / "bank.sqlite3"))
+    texts = ["Which museum in Paris holds the Mona Lisa?", "Who painted water lilies near Paris?", "What art movement began in Paris cafes?"]
+    assert bank.add_questions("Art", "easy", [_question(i, text) for i, text in enumerate(texts, 1)]) == 3
+    monkeypatch.setattr(server, "question_bank", bank)
+
+    for limit, expected in ((-1, 1), (0, 1), (2, 2)):
+        assert len(asyncio.run(server.search_questions("Paris", limit=limit))["questions"]) == expected
+
+
+def test_bank_is_read_and_written_off_the_event_loop(server, tmp_path, monkeypatch):
+    bank = QuestionBank(str(tmp_path / "bank.sqlite3"))
+    monkeypatch.setattr(server, "question_bank", bank)
+    threads = []
+    for name in ("sample", "add_questions"):
+        method = getattr(bank, name)
+        monkeypatch.setattr(bank, name, lambda *args, method=method: threads.append(threading.current_thread()) or method(*args))
+
+    quiz = asyncio.run(server.assemble_quiz("Art", "easy", 3))
+
+    assert len(quiz.questions) == 3
+    assert len(threads) == 2 and threading.current_thread() not in threads
@@ -0,0 +1,37 @@
+import asyncio
+
+import llm_backends
+from llm_backends import CompletionChatModel, LazyBackend
+
+
+class EchoCompletionLLM:
+    """Stands in for HuggingFacePipeline: takes a prompt string, returns a str."""
+
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return '{"title": "Art Quiz"}'
+
+
+def test_completion_model_renders_messages_and_returns_text_message():
+    llm = EchoCompletionLLM()
+    model = CompletionChatModel(llm)
+
+    reply = model.invoke([{"role": "system", "content": "You write quizzes."}, {"role": "user", "content": "A quiz about art."}])
+
+    assert reply.content == '{"title": "Art Quiz"}'
+    assert llm.prompts == ["System: You write quizzes.\n\nUser: A quiz about art.\n\nAssistant:"]
+
+
+def test_failed_warm_up_is_logged_and_reported(monkeypatch):
+    events = []
+    monkeypatch.setattr(llm_backends, "log_event", lambda event, **fields: events.append((event, fields)))
+    backend = LazyBackend("missing")
+
+    asyncio.run(backend.warm_up())
+
+    assert not backend.ready
+    assert "Unknown LLM backend 'missing'" in backend.error
+    assert events == [("llm_backend_error", {"backend": "missing", "error": backend.error})]
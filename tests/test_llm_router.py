@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+from llm_router import Endpoint, LLMRouter
+
+STUB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "stub_openai_server.py")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _stats(port: int) -> dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/stats", timeout=1) as response:
+        return json.load(response)
+
+
+@pytest.fixture
+def stub_server():
+    """Start ``stub_openai_server.py`` processes; returns a function giving each one's port."""
+    processes = []
+
+    def start(latency: float, error_rate: float = 0.0) -> int:
+        port = _free_port()
+        processes.append(subprocess.Popen(
+            [sys.executable, STUB, "--port", str(port), "--latency", str(latency), "--latency-jitter", "0", "--error-rate", str(error_rate)],
+            stdout=subprocess.DEVNULL,
+        ))
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                _stats(port)
+                return port
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    yield start
+    for process in processes:
+        process.terminate()
+        process.wait()
+
+
+def _endpoint(name: str, port: int) -> Endpoint:
+    return Endpoint(name, f"http://127.0.0.1:{port}/v1", "stub")
+
+
+def _messages(i: int = 0) -> list:
+    return [{"role": "system", "content": "You write quizzes."}, {"role": "user", "content": f"Generate a quiz about topic {i} with 3 multiple choice questions."}]
+
+
+def _run(router: LLMRouter, calls):
+    async def main():
+        try:
+            return await calls()
+        finally:
+            await router.aclose()
+    return asyncio.run(main())
+
+
+def test_concurrent_calls_spread_across_endpoints(stub_server):
+    a, b = stub_server(0.2), stub_server(0.2)
+    router = LLMRouter([_endpoint("a", a), _endpoint("b", b)], hedge=False)
+
+    replies = _run(router, lambda: asyncio.gather(*(router.ainvoke(_messages(i)) for i in range(20))))
+
+    assert all(reply.content for reply in replies)
+    assert _stats(a)["requests"] == 10
+    assert _stats(b)["requests"] == 10
+    assert all(endpoint.in_flight == 0 for endpoint in router.endpoints)
+
+
+def test_slow_call_is_hedged_to_another_endpoint(stub_server):
+    slow, fast = stub_server(2.0), stub_server(0.05)
+    router = LLMRouter([_endpoint("slow", slow), _endpoint("fast", fast)], hedge_min_delay=0.1)
+    # The slow endpoint looks fast from its history, so it is picked first.
+    router.endpoints[0].ewma = 0.01
+    router.endpoints[0].latencies.extend([0.05] * 10)
+    router.endpoints[1].ewma = 0.05
+
+    started = time.perf_counter()
+    reply = _run(router, lambda: router.ainvoke(_messages()))
+
+    assert reply.content
+    assert time.perf_counter() - started < 1.5
+    assert router.hedged == 1
+    assert router.hedge_wins == 1
+    assert _stats(fast)["requests"] == 1
+    assert all(endpoint.in_flight == 0 for endpoint in router.endpoints)
+
+
+def test_failed_call_fails_over_and_endpoint_cools_down(stub_server):
+    broken, healthy = stub_server(0.0, error_rate=1.0), stub_server(0.0)
+    router = LLMRouter([_endpoint("broken", broken), _endpoint("healthy", healthy)], hedge=False)
+    router.endpoints[1].ewma = 0.05
+
+    async def calls():
+        first = await router.ainvoke(_messages(1))
+        second = await router.ainvoke(_messages(2))
+        return first, second
+
+    first, second = _run(router, calls)
+
+    assert first.content and second.content
+    assert router.failovers == 1
+    assert router.endpoints[0].errors == 1
+    # The broken endpoint sits out its cooldown, so the second call goes straight to the healthy one.
+    assert _stats(broken)["requests"] == 1
+    assert _stats(healthy)["requests"] == 2
+
+
+def test_stream_fails_over_before_first_delta(stub_server):
+    broken, healthy = stub_server(0.0, error_rate=1.0), stub_server(0.0)
+    router = LLMRouter([_endpoint("broken", broken), _endpoint("healthy", healthy)], hedge=False)
+    router.endpoints[1].ewma = 0.05
+
+    async def calls():
+        return "".join([delta.content async for delta in router.astream(_messages())])
+
+    text = _run(router, calls)
+
+    assert json.loads(text)["questions"]
+    assert router.failovers == 1
+
+
+def test_cancelled_call_cancels_the_attempt_awaiting_its_hedge(stub_server):
+    slow, fast = stub_server(2.0), stub_server(0.05)
+    router = LLMRouter([_endpoint("slow", slow), _endpoint("fast", fast)], hedge_min_delay=1.0)
+    router.endpoints[0].ewma = 0.01
+    router.endpoints[0].latencies.extend([0.05] * 10)
+    router.endpoints[1].ewma = 0.05
+
+    async def calls():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(router.ainvoke(_messages()), 0.2)
+        await asyncio.sleep(0.05)
+        return [endpoint.in_flight for endpoint in router.endpoints]
+
+    assert _run(router, calls) == [0, 0]
+    assert router.hedged == 0
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from local_inference import DynamicBatcher, LocalChatModel
+
+
+class RecordingBatchFn:
+    """Doubles every item and records the batches it was called with."""
+
+    def __init__(self, gate: threading.Event = None, error: Exception = None):
+        self.batches = []
+        self.gate = gate
+        self.error = error
+
+    def __call__(self, items):
+        self.batches.append(list(items))
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return [item * 2 for item in items]
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+def test_batches_are_capped_at_max_batch_size(executor):
+    batch_fn = RecordingBatchFn()
+    batcher = DynamicBatcher(executor, batch_fn, max_batch_size=3, max_wait=0.1)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(7)))
+
+    assert asyncio.run(main()) == [i * 2 for i in range(7)]
+    assert batch_fn.batches == [[0, 1, 2], [3, 4, 5], [6]]
+    assert batcher.stats()["batches"] == 3
+
+
+def test_items_within_the_wait_window_share_a_batch(executor):
+    batch_fn = RecordingBatchFn()
+    batcher = DynamicBatcher(executor, batch_fn, max_batch_size=8, max_wait=0.2)
+
+    async def submit_later(item, delay):
+        await asyncio.sleep(delay)
+        return await batcher.submit(item)
+
+    async def main():
+        return await asyncio.gather(submit_later(1, 0), submit_later(2, 0.05), submit_later(3, 0.5))
+
+    assert asyncio.run(main()) == [2, 4, 6]
+    assert batch_fn.batches == [[1, 2], [3]]
+
+
+def test_cancelled_submitters_are_left_out_of_their_batch(executor):
+    gate = threading.Event()
+    batch_fn = RecordingBatchFn(gate)
+    batcher = DynamicBatcher(executor, batch_fn, max_batch_size=8, max_wait=0.05)
+
+    async def main():
+        first = asyncio.create_task(batcher.submit(1))
+        await asyncio.sleep(0.1)
+        # The first batch is still generating, so these two wait in the queue.
+        cancelled = asyncio.create_task(batcher.submit(2))
+        kept = asyncio.create_task(batcher.submit(3))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        gate.set()
+        return await first, await kept, await asyncio.gather(cancelled, return_exceptions=True)
+
+    first, kept, (cancelled,) = asyncio.run(main())
+
+    assert (first, kept) == (2, 6)
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert batch_fn.batches == [[1], [3]]
+
+
+def test_batch_errors_reach_every_submitter(executor):
+    batch_fn = RecordingBatchFn(error=RuntimeError("out of memory"))
+    batcher = DynamicBatcher(executor, batch_fn, max_batch_size=8, max_wait=0.05)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+
+    assert batch_fn.batches == [[0, 1, 2]]
+    assert all(isinstance(result, RuntimeError) and str(result) == "out of memory" for result in results)
+
+
+def _no_model(model_name, num_threads):
+    pass
+
+
+def _slow_batch(conversations, max_new_tokens):
+    time.sleep(1)
+    return ["{}" for _ in conversations]
+
+
+def test_close_fails_waiting_prompts_without_waiting_for_the_running_batch():
+    model = LocalChatModel("stub", workers=1, max_batch_size=1, max_wait=0, batch_fn=_slow_batch, initializer=_no_model)
+    messages = [{"role": "user", "content": "Generate a quiz"}]
+
+    async def main():
+        # The first prompt is generating; the second waits in the queue for the only worker.
+        calls = [asyncio.create_task(model.ainvoke(messages)) for _ in range(2)]
+        await asyncio.sleep(0.2)
+        started = time.perf_counter()
+        model.close()
+        closed_in = time.perf_counter() - started
+        results = await asyncio.wait_for(asyncio.gather(*calls, return_exceptions=True), 0.5)
+        with pytest.raises(RuntimeError):
+            await model.ainvoke(messages)
+        return closed_in, results
+
+    closed_in, results = asyncio.run(main())
+
+    assert closed_in < 0.1
+    assert [type(result) for result in results] == [RuntimeError] * 2
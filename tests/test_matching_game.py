@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+from harness import asgi_request
+
+
+def post(server, path, body):
+    status, payload = asyncio.run(asgi_request(server.app, "POST", path, body))
+    return status, payload
+
+
+def test_matching_game_does_not_shadow_quiz_cache(server):
+    status, body = post(server, "/api/matching-game", {"topic": "Rome", "num_pairs": 3})
+    assert status == 200
+    assert len(json.loads(body)["pairs"]) == 3
+
+    for difficulty in ("matching-game", ""):
+        status, body = post(server, "/api/generate-quiz", {"topic": "Rome", "difficulty": difficulty, "num_questions": 3})
+        assert status == 200
+        assert len(json.loads(body)["questions"]) == 3
+
+    status, body = post(server, "/api/generate-quiz/stream", {"topic": "Rome", "difficulty": "", "num_questions": 3})
+    events = [json.loads(line) for line in body.splitlines()]
+    assert status == 200
+    assert [event["type"] for event in events] == ["question"] * 3 + ["done"]
+
+    assert server.matching_cache.stats()["misses"] == 1
+    assert server.quiz_cache.stats()["hits"] == 1
+
+
+def test_repeat_matching_game_is_served_from_cache(server):
+    post(server, "/api/matching-game", {"topic": "Volcanoes", "num_pairs": 4})
+    llm = asyncio.run(server.llm_backend.get())
+    assert sum(llm._seen.values()) == 1
+    status, body = post(server, "/api/matching-game", {"topic": " volcanoes", "num_pairs": 2})
+    assert status == 200
+    assert len(json.loads(body)["pairs"]) == 2
+    assert server.matching_cache.stats()["hits"] == 1
+    # FakeChatModel counts every prompt it answers.
+    assert sum(llm._seen.values()) == 1
+
+
+def test_concurrent_quiz_and_game_do_not_coalesce(server):
+    async def both():
+        return await asyncio.gather(
+            asgi_request(server.app, "POST", "/api/matching-game", {"topic": "Mars", "num_pairs": 2}),
+            asgi_request(server.app, "POST", "/api/generate-quiz", {"topic": "Mars", "difficulty": "matching-game", "num_questions": 2}),
+        )
+
+    (game_status, game), (quiz_status, quiz) = asyncio.run(both())
+    assert game_status == quiz_status == 200
+    assert "pairs" in json.loads(game)
+    assert "questions" in json.loads(quiz)
+    assert server.quiz_flights.coalesced == 0
@@ -0,0 +1,54 @@
+import asyncio
+import sqlite3
+import threading
+
+from quiz_cache import SQLiteQuizCache
+
+
+def _quiz(n: int) -> dict:
+    return {"title": "Quiz", "description": "", "questions": [{"id": i} for i in range(1, n + 1)]}
+
+
+def test_sqlite_hits_do_not_write(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = SQLiteQuizCache(path, max_entries=2)
+    cache.put("Art", "easy", _quiz(3))
+    reader = sqlite3.connect(path)
+    used_at = reader.execute("SELECT used_at FROM quiz_cache").fetchone()[0]
+
+    assert cache.get("Art", "easy", 2) == _quiz(2)
+    assert reader.execute("SELECT used_at FROM quiz_cache").fetchone()[0] == used_at
+
+
+def test_sqlite_eviction_follows_recency_kept_in_memory(tmp_path):
+    cache = SQLiteQuizCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.put("Art", "easy", _quiz(3))
+    cache.put("Music", "easy", _quiz(3))
+    assert cache.get("Art", "easy", 3) is not None
+
+    cache.put("Science", "easy", _quiz(3))
+
+    assert cache.get("Art", "easy", 3) is not None
+    assert cache.get("Music", "easy", 3) is None
+    assert len(cache) == 2
+
+
+def test_async_access_runs_off_the_event_loop(tmp_path, monkeypatch):
+    cache = SQLiteQuizCache(str(tmp_path / "cache.sqlite3"))
+    threads = []
+    load = cache._load
+
+    def recording_load(key, stale=False):
+        threads.append(threading.current_thread())
+        return load(key, stale)
+
+    monkeypatch.setattr(cache, "_load", recording_load)
+
+    async def main():
+        await cache.aput("Art", "easy", _quiz(3))
+        return await cache.aget("Art", "easy", 2), await cache.aget_stale("Art", "easy", 2)
+
+    fresh, stale = asyncio.run(main())
+
+    assert fresh == stale == _quiz(2)
+    assert threads and threading.current_thread() not in threads
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from quiz_jobs import JobQueue
+
+
+def test_failed_prewarm_attempts_count_toward_the_budget(server, monkeypatch):
+    async def refresh(topic, difficulty, num_questions):
+        # A call whose output could not be used still spent its tokens.
+        server.record_llm_call(100, 20)
+        raise HTTPException(status_code=500, detail="LLM generation error: no valid questions")
+
+    monkeypatch.setattr(server, "refresh_cached_quiz", refresh)
+    queue = server.job_queue
+    job = queue.submit("Art", "easy", 5, kind="prewarm")
+
+    async def run_attempts():
+        for _ in range(queue.max_attempts):
+            claimed = queue.claim()
+            try:
+                await server.run_quiz_job(claimed)
+            except Exception as e:
+                queue.fail(claimed["id"], str(e), e.tokens)
+
+    asyncio.run(run_attempts())
+
+    failed = queue.get(job["id"])
+    assert failed["status"] == "failed"
+    assert "no valid questions" in failed["error"]
+    assert failed["tokens"] == 240
+    assert queue.tokens_spent("prewarm", 0) == 240
+
+
+def test_workers_record_tokens_of_failed_attempts(server):
+    attempts = []
+
+    async def run_job(job):
+        attempts.append(job["attempts"])
+        if len(attempts) == 1:
+            raise server.JobError("malformed output", tokens=70)
+        return {"title": "Art Quiz"}, 30
+
+    async def main():
+        workers = server.JobWorkers(server.job_queue, run_job, workers=1, poll_seconds=0.01)
+        workers.start()
+        job = await workers.submit("Art", "easy", 5, kind="prewarm")
+        try:
+            while server.job_queue.get(job["id"])["status"] != "done":
+                await workers.wait_for_update(job["id"], 0.05)
+        finally:
+            await workers.stop()
+        return server.job_queue.get(job["id"])
+
+    job = asyncio.run(main())
+
+    assert attempts == [1, 2]
+    assert job["tokens"] == 100
+
+
+def test_expired_lease_is_retried_until_attempts_run_out():
+    queue = JobQueue(":memory:", lease_seconds=0, max_attempts=2)
+    job = queue.submit("Art", "easy", 5)
+
+    # Each claim stands for a worker that crashed and left the job running.
+    assert queue.claim()["attempts"] == 1
+    assert queue.claim()["attempts"] == 2
+    assert queue.claim() is None
+
+    failed = queue.get(job["id"])
+    assert failed["status"] == "failed"
+    assert failed["attempts"] == 2
+    assert failed["finished_at"] is not None
+
+
+def test_waiters_are_dropped_when_they_stop_waiting(server):
+    workers = server.job_workers
+
+    async def main():
+        await asyncio.gather(workers.wait_for_update("gone", 0.01), workers.wait_for_update("gone", 0.02))
+
+    asyncio.run(main())
+
+    assert workers._waiters == {}
+
+
+def test_long_poll_of_a_purged_job_answers_404(server, monkeypatch):
+    job = server.job_queue.submit("Art", "easy", 5)
+    gets = []
+    original = server.job_queue.get
+
+    def get_then_purge(job_id):
+        # Retention purges the job while the client is waiting.
+        gets.append(job_id)
+        return original(job_id) if len(gets) == 1 else None
+
+    monkeypatch.setattr(server.job_queue, "get", get_then_purge)
+    monkeypatch.setattr(server.job_workers, "poll_seconds", 0.01)
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(server.get_quiz_job(job["id"], wait=1.0))
+
+    assert raised.value.status_code == 404
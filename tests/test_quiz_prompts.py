@@ -0,0 +1,60 @@
+import pytest
+
+import quiz_prompts
+from quiz_prompts import QuizPromptBuilder, count_tokens
+
+
+class FakeEncoding:
+    def encode(self, text):
+        return text.split()
+
+
+class FakeTiktoken:
+    def __init__(self, error=None):
+        self.loads = 0
+        self.error = error
+
+    def get_encoding(self, name):
+        self.loads += 1
+        if self.error is not None:
+            raise self.error
+        return FakeEncoding()
+
+
+@pytest.fixture
+def fake_tiktoken(monkeypatch):
+    def install(error=None):
+        fake = FakeTiktoken(error)
+        monkeypatch.setattr(quiz_prompts, "tiktoken", fake)
+        quiz_prompts.load_encoding.cache_clear()
+        quiz_prompts._count_fixed_tokens.cache_clear()
+        return fake
+
+    yield install
+    quiz_prompts.load_encoding.cache_clear()
+    quiz_prompts._count_fixed_tokens.cache_clear()
+
+
+def test_encoding_is_loaded_on_first_count_not_at_build(fake_tiktoken):
+    fake = fake_tiktoken()
+    builder = QuizPromptBuilder.from_quizzes({"Art": [{"question": "Who painted it?", "options": ["A", "B", "C", "D"], "correct_answer": 0, "explanation": "A."}]})
+    assert fake.loads == 0
+    assert quiz_prompts.tokenizer_name() == "tiktoken (not loaded yet)"
+
+    prompt = builder.build("Art", "easy", 3)
+
+    assert fake.loads == 1
+    assert prompt.input_tokens == sum(count_tokens(message["content"]) for message in prompt.messages)
+    assert builder.stats()["tokenizer"] == "tiktoken"
+
+
+def test_unavailable_encoding_is_logged_and_estimated(fake_tiktoken, monkeypatch):
+    fake_tiktoken(OSError("no network"))
+    events = []
+    monkeypatch.setattr(quiz_prompts, "log_event", lambda event, **fields: events.append((event, fields)))
+
+    assert count_tokens("x" * 40) == 10
+    assert count_tokens("y" * 8) == 2
+
+    assert events == [("tokenizer_unavailable", {"error": "no network"})]
+    assert quiz_prompts.tokenizer_name() == "estimate"
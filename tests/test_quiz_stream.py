@@ -0,0 +1,43 @@
+import json
+
+from quiz_stream import QuestionStreamParser
+
+QUESTIONS = [
+    {"id": 1, "question": "Which symbol closes a JSON object: } or ]?", "options": ["}", "]", "{", "["], "correct_answer": 0, "explanation": "A brace, \"}\", closes it."},
+    {"id": 2, "question": "What does \\n mean in a string?", "options": ["A newline", "A tab", "A quote", "Nothing"], "correct_answer": 0, "explanation": "It is an escape."},
+]
+TEXT = json.dumps({"title": "JSON Quiz", "questions": QUESTIONS, "description": "Braces [inside] {strings}"})
+
+
+def _feed_in_chunks(text: str, size: int):
+    parser = QuestionStreamParser()
+    questions = []
+    for start in range(0, len(text), size):
+        questions.extend(parser.feed(text[start:start + size]))
+    return parser, questions
+
+
+def test_every_chunk_boundary_yields_the_same_questions():
+    # Size 1 splits inside every string and between a backslash and the character it escapes.
+    for size in range(1, 40):
+        parser, questions = _feed_in_chunks(TEXT, size)
+        assert questions == QUESTIONS, size
+        assert parser.done
+        assert parser.text == TEXT
+
+
+def test_truncated_tail_yields_only_the_closed_questions():
+    cut = TEXT.index('{"id": 2') + 40
+    parser, questions = _feed_in_chunks(TEXT[:cut], 7)
+
+    assert questions == QUESTIONS[:1]
+    assert not parser.done
+
+
+def test_compact_items_are_arrays():
+    text = json.dumps({"t": "Quiz", "q": [["What is 2 + 2?", ["4", "3", "5", "[22]"], 0, "Add them."]]})
+    parser = QuestionStreamParser(item="[")
+
+    questions = [question for char in text for question in parser.feed(char)]
+
+    assert questions == [["What is 2 + 2?", ["4", "3", "5", "[22]"], 0, "Add them."]]
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from harness import asgi_request
+from llm_backends import TextMessage
+
+
+def test_circuit_breaker_opens_then_half_opens_then_closes(server):
+    breaker = server.CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+
+    async def call(fail=False, hold=0.0):
+        async with breaker.call():
+            await asyncio.sleep(hold)
+            if fail:
+                raise RuntimeError("provider down")
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await call(fail=True)
+        assert breaker.state == "open"
+        with pytest.raises(HTTPException) as rejected:
+            await call()
+        assert rejected.value.status_code == 503
+
+        # A failed trial opens the circuit again.
+        await asyncio.sleep(0.06)
+        assert breaker.state == "half_open"
+        with pytest.raises(RuntimeError):
+            await call(fail=True)
+        assert breaker.state == "open"
+
+        # Only one trial runs at a time; its success closes the circuit.
+        await asyncio.sleep(0.06)
+        trial = asyncio.create_task(call(hold=0.02))
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException):
+            await call()
+        await trial
+        assert breaker.state == "closed"
+        await call(fail=True)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(main())
+    assert breaker.stats() == {"state": "closed", "consecutive_failures": 1, "opened": 2, "rejected": 2}
+
+
+def test_http_errors_do_not_count_as_failures(server):
+    breaker = server.CircuitBreaker(failure_threshold=1, reset_seconds=60)
+
+    async def main():
+        with pytest.raises(HTTPException):
+            async with breaker.call():
+                raise HTTPException(status_code=503)
+
+    asyncio.run(main())
+    assert breaker.state == "closed"
+
+
+def test_generation_past_the_deadline_gets_the_fallback(make_server):
+    server = make_server(QUIZ_REQUEST_DEADLINE_SECONDS="0.2", QUIZ_FAKE_LATENCY="1")
+    request = {"topic": "Historical Events", "difficulty": "medium", "num_questions": 3}
+
+    started = time.perf_counter()
+    status, body = asyncio.run(asgi_request(server.app, "POST", "/api/generate-quiz", request))
+
+    assert status == 200
+    assert time.perf_counter() - started < 0.8
+    assert json.loads(body) == server.fallback_response("Historical Events", "medium", 3).content
+
+
+class StallingChatModel:
+    """Streams the start of an answer, then never sends another chunk."""
+
+    def __init__(self):
+        self.closed = False
+
+    async def astream(self, messages):
+        try:
+            yield TextMessage('{"title": "Art Quiz", "questions": [')
+            await asyncio.sleep(3600)
+        finally:
+            self.closed = True
+
+
+def test_stalled_stream_is_abandoned_and_releases_its_slot(make_server):
+    server = make_server(QUIZ_LLM_STREAM_IDLE_SECONDS="0.2")
+    model = StallingChatModel()
+    server.llm_backend._llm = model
+
+    started = time.perf_counter()
+    status, body = asyncio.run(asgi_request(
+        server.app, "POST", "/api/generate-quiz/stream", {"topic": "Art", "difficulty": "easy", "num_questions": 3}
+    ))
+
+    events = [json.loads(line) for line in body.splitlines()]
+    assert status == 200
+    assert time.perf_counter() - started < 1.0
+    assert events[-1]["source"] == "fallback"
+    assert model.closed
+    assert server.llm_gate.in_flight == 0
+    assert server.llm_breaker.failures == 1
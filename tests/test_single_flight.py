@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import pytest
+
+from harness import asgi_request
+
+
+def test_concurrent_identical_requests_share_one_llm_call(make_server):
+    server = make_server(QUIZ_FAKE_LATENCY="0.1")
+    request = {"topic": "Glaciers", "difficulty": "medium", "num_questions": 3}
+
+    async def main():
+        return await asyncio.gather(*(asgi_request(server.app, "POST", "/api/generate-quiz", request) for _ in range(5)))
+
+    responses = asyncio.run(main())
+
+    assert [status for status, _ in responses] == [200] * 5
+    assert len({body for _, body in responses}) == 1
+    assert json.loads(responses[0][1])["title"] == "Glaciers Quiz"
+    llm = asyncio.run(server.llm_backend.get())
+    # FakeChatModel counts every prompt it answers.
+    assert sum(llm._seen.values()) == 1
+    assert server.quiz_flights.coalesced == 4
+    assert server.quiz_flights.in_flight == 0
+
+
+def test_leader_failure_reaches_followers_and_clears_the_key(server):
+    flights = server.SingleFlight()
+    calls = []
+
+    async def fail():
+        calls.append("fail")
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider down")
+
+    async def succeed():
+        calls.append("succeed")
+        return "quiz"
+
+    async def main():
+        results = await asyncio.gather(*(flights.do("key", fail) for _ in range(3)), return_exceptions=True)
+        return results, await flights.do("key", succeed)
+
+    results, retry = asyncio.run(main())
+
+    assert [type(result) for result in results] == [RuntimeError] * 3
+    assert calls == ["fail", "succeed"]
+    assert retry == "quiz"
+    assert flights.coalesced == 2
+    assert flights.in_flight == 0
+
+
+def test_cancelled_leader_does_not_cancel_the_shared_work(server):
+    flights = server.SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "quiz"
+
+    async def main():
+        leader = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == "quiz"
+    assert flights.in_flight == 0
+
+
+def test_cancelled_flight_reaches_followers_and_clears_the_key(server):
+    flights = server.SingleFlight()
+
+    async def hang():
+        await asyncio.sleep(3600)
+
+    async def succeed():
+        return "quiz"
+
+    async def main():
+        task = flights.start("key", hang)
+        followers = [asyncio.create_task(flights.do("key", hang)) for _ in range(2)]
+        await asyncio.sleep(0)
+        task.cancel()
+        results = await asyncio.gather(*followers, return_exceptions=True)
+        return results, await flights.do("key", succeed)
+
+    results, retry = asyncio.run(main())
+
+    assert [type(result) for result in results] == [asyncio.CancelledError] * 2
+    assert retry == "quiz"
+    assert flights.in_flight == 0